@@ -4,443 +4,1335 @@ Args: event with httpMethod, body, queryStringParameters; context with request_i
 Returns: HTTP response with statusCode, headers, body
 '''
 
+import base64
+import csv
+import gzip
+import io
 import json
-import os
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+import math
+import re
+import select
+import time
+import traceback
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
+from access_token import AuthError, get_request_claims, get_request_user_id, has_permission
+from runtime import Request, Router, json_response
+from serialization import compressed
 
 SCHEMA = 't_p86529894_ecommerce_management'
 
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(database_url)
-    return conn
-
 def table(name: str) -> str:
     return f'"{SCHEMA}"."{name}"'
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
-    path: str = event.get('queryStringParameters', {}).get('path', '')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+PRODUCTS_PAGE_SIZE = 100
+PRODUCTS_MAX_PAGE_SIZE = 500
+TRIGRAM_THRESHOLD = 0.3
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_products(cursor, search: str, category: str, page: int, limit: int,
+                    fuzzy: bool = False, include_deleted: bool = False) -> Dict[str, Any]:
+    if not search:
+        rank_sql, rank_params = '0', []
+        match_sql, match_params = 'true', []
+    elif fuzzy:
+        # Оператор % (а не similarity() > x) использует idx_products_name_trgm; порог задается на транзакцию
+        cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", (str(TRIGRAM_THRESHOLD),))
+        rank_sql, rank_params = 'similarity(p.name, %s)', [search]
+        match_sql, match_params = "(p.name %% %s OR p.sku ILIKE %s ESCAPE '\\')", [search, escape_like(search) + '%']
+    else:
+        ts_query = "(websearch_to_tsquery('russian', %s) || websearch_to_tsquery('english', %s))"
+        rank_sql, rank_params = f'ts_rank(p.search_vector, {ts_query})', [search, search]
+        match_sql, match_params = f'p.search_vector @@ {ts_query}', [search, search]
+    
+    category_sql, category_params = 'true', []
+    if category and category != 'all':
+        category_sql, category_params = 'category = %s', [category]
+    
+    # Условие совпадает с предикатом частичных индексов idx_products_live_*
+    if not include_deleted:
+        match_sql += " AND p.status <> 'deleted'"
+    
+    # Без поиска фасеты берутся из справочника product_categories, который ведет триггер
+    if search or include_deleted:
+        facets_sql = 'SELECT category, COUNT(*) as cnt FROM matched WHERE category IS NOT NULL GROUP BY category'
+    else:
+        facets_sql = f'SELECT category, product_count as cnt FROM "{SCHEMA}"."product_categories" WHERE product_count > 0'
+    
+    # Страница, фасеты по категориям и общее число считаются одним запросом
+    cursor.execute(f'''
+        WITH matched AS (
+            SELECT p.id, p.name, p.description, p.price, p.category, p.stock, p.image_url, p.created_at,
+                   {rank_sql} as rank
+            FROM "{SCHEMA}"."products" p
+            WHERE {match_sql}
+        ),
+        filtered AS (
+            SELECT * FROM matched WHERE {category_sql}
+        ),
+        page AS (
+            SELECT * FROM filtered
+            ORDER BY rank DESC, created_at DESC, id DESC
+            LIMIT %s OFFSET %s
+        )
+        SELECT
+            (SELECT COALESCE(json_agg(json_build_object(
+                'id', id, 'name', name, 'description', description, 'price', price,
+                'category', category, 'stock', stock, 'image', image_url
+            ) ORDER BY rank DESC, created_at DESC, id DESC), '[]'::json) FROM page) as products,
+            (SELECT COALESCE(json_agg(json_build_object('category', category, 'count', cnt) ORDER BY category), '[]'::json)
+             FROM ({facets_sql}) f) as facets,
+            (SELECT COUNT(*) FROM filtered) as total
+    ''', rank_params + match_params + category_params + [limit, (page - 1) * limit])
+    
+    return cursor.fetchone()
+
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_ROWS = 50000
+DEFAULT_PRODUCT_IMAGE = 'https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=400'
+# Пределы колонок products: NUMERIC(10,2), INTEGER, VARCHAR(500)
+PRICE_LIMIT = 10 ** 8
+STOCK_LIMIT = 2 ** 31 - 1
+IMAGE_URL_MAX_LENGTH = 500
+
+def parse_bulk_body(body: str, content_type: str) -> List[Any]:
+    body = body.strip()
+    if 'ndjson' in content_type or not body.startswith('['):
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    return json.loads(body)
+
+def validate_product_row(row: Any) -> Dict[str, Any]:
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+    
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise ValueError('sku is required')
+    if len(sku) > 100:
+        raise ValueError('sku is longer than 100 characters')
+    
+    op = row.get('op', 'upsert')
+    if op == 'delete':
+        return {'op': op, 'sku': sku}
+    if op != 'upsert':
+        raise ValueError(f'unknown op: {op}')
+    
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        user_id = 1
-        
-        if path == 'auth/login' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            email = body_data.get('email')
-            
-            cursor.execute(f'SELECT id, email, full_name, company_name, subscription_plan FROM "{SCHEMA}"."users" WHERE email = %s', (email,))
-            user = cursor.fetchone()
-            
-            if user:
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'user': {
-                            'id': user['id'],
-                            'email': user['email'],
-                            'fullName': user['full_name'],
-                            'companyName': user['company_name'],
-                            'plan': user['subscription_plan']
-                        }
-                    }),
-                    'isBase64Encoded': False
-                }
-            
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid credentials'}),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'products' and method == 'GET':
-            category = event.get('queryStringParameters', {}).get('category', '')
-            
-            query = f'SELECT id, name, description, price, category, stock, image_url FROM "{SCHEMA}"."products" WHERE 1=1'
-            params = []
-            
-            if category and category != 'all':
-                query += ' AND category = %s'
-                params.append(category)
-            
-            query += ' ORDER BY created_at DESC'
-            
-            cursor.execute(query, params)
-            products = cursor.fetchall()
-            
-            result = []
-            for p in products:
-                result.append({
-                    'id': p['id'],
-                    'name': p['name'],
-                    'description': p['description'],
-                    'price': float(p['price']),
-                    'category': p['category'],
-                    'stock': p['stock'],
-                    'image': p['image_url']
-                })
-            
-            cursor.execute(f'SELECT DISTINCT category FROM "{SCHEMA}"."products" WHERE category IS NOT NULL ORDER BY category')
-            categories = [row['category'] for row in cursor.fetchall()]
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'products': result, 'categories': categories}),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'products' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            
-            cursor.execute(f'''
-                INSERT INTO "{SCHEMA}"."products" (name, description, price, category, stock, image_url)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id, name, description, price, category, stock, image_url
-            ''', (
-                body_data.get('name'),
-                body_data.get('description', ''),
-                body_data.get('price'),
-                body_data.get('category'),
-                body_data.get('stock', 0),
-                body_data.get('image', 'https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=400')
-            ))
-            
-            product = cursor.fetchone()
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 201,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'product': {
-                        'id': product['id'],
-                        'name': product['name'],
-                        'description': product['description'],
-                        'price': float(product['price']),
-                        'category': product['category'],
-                        'stock': product['stock'],
-                        'image': product['image_url']
-                    }
-                }),
-                'isBase64Encoded': False
-            }
+        price = round(float(row.get('price')), 2)
+        # Импорт приводит числа к виду "12.0", поэтому остаток принимается и как дробь с нулевой частью
+        stock_value = float(row.get('stock', 0) or 0)
+        cost_price = round(float(row.get('costPrice', 0) or 0), 2)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('price, stock and costPrice must be numbers')
+    if not math.isfinite(price) or not math.isfinite(cost_price):
+        raise ValueError('price and costPrice must be finite numbers')
+    if not stock_value.is_integer():
+        raise ValueError('stock must be a whole number')
+    stock = int(stock_value)
+    if price < 0 or stock < 0 or cost_price < 0:
+        raise ValueError('price, stock and costPrice must be non-negative')
+    if price >= PRICE_LIMIT or cost_price >= PRICE_LIMIT or stock > STOCK_LIMIT:
+        raise ValueError(f'price and costPrice must be below {PRICE_LIMIT}, stock at most {STOCK_LIMIT}')
+    
+    image_url = str(row.get('image') or DEFAULT_PRODUCT_IMAGE)
+    if len(image_url) > IMAGE_URL_MAX_LENGTH:
+        raise ValueError(f'image is longer than {IMAGE_URL_MAX_LENGTH} characters')
+    
+    return {
+        'op': op,
+        'sku': sku,
+        'name': name[:255],
+        'description': row.get('description', '') or '',
+        'price': price,
+        'cost_price': cost_price,
+        'category': str(row.get('category') or 'Uncategorized')[:100],
+        'stock': stock,
+        'image_url': image_url
+    }
+
+def upsert_products(cursor, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return execute_values(cursor, f'''
+        INSERT INTO "{SCHEMA}"."products" (sku, name, description, price, cost_price, category, stock, image_url)
+        VALUES %s
+        ON CONFLICT (sku) DO UPDATE SET
+            name = EXCLUDED.name, description = EXCLUDED.description, price = EXCLUDED.price,
+            cost_price = EXCLUDED.cost_price, category = EXCLUDED.category, stock = EXCLUDED.stock,
+            image_url = EXCLUDED.image_url, status = 'active', deleted_at = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING id, sku, (xmax = 0) as inserted
+    ''', [(r['sku'], r['name'], r['description'], r['price'], r['cost_price'], r['category'], r['stock'], r['image_url'])
+          for r in rows], fetch=True)
+
+def apply_product_chunk(cursor, rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    upserts = [r for r in rows if r['op'] == 'upsert']
+    deletes = [r['sku'] for r in rows if r['op'] == 'delete']
+    by_sku: Dict[str, Dict[str, Any]] = {}
+    
+    for row in upsert_products(cursor, upserts) if upserts else []:
+        by_sku[row['sku']] = {'id': row['id'], 'status': 'created' if row['inserted'] else 'updated'}
+    if deletes:
+        cursor.execute(f'''
+            UPDATE "{SCHEMA}"."products"
+            SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE sku = ANY(%s) AND status <> 'deleted'
+            RETURNING id, sku
+        ''', (deletes,))
+        for row in cursor.fetchall():
+            by_sku[row['sku']] = {'id': row['id'], 'status': 'deleted'}
+    return by_sku
+
+def apply_bulk_products(conn, cursor, raw_rows: List[Any]) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = [{'index': i} for i in range(len(raw_rows))]
+    valid: Dict[str, int] = {}
+    normalized: Dict[int, Dict[str, Any]] = {}
+    
+    for i, raw in enumerate(raw_rows):
+        try:
+            row = validate_product_row(raw)
+        except ValueError as e:
+            results[i].update({'status': 'error', 'error': str(e)})
+            continue
+        previous = valid.get(row['sku'])
+        if previous is not None:
+            results[previous].update({'sku': row['sku'], 'status': 'skipped', 'error': 'superseded by a later row with the same sku'})
+            del normalized[previous]
+        valid[row['sku']] = i
+        normalized[i] = row
+    
+    indexes = sorted(normalized)
+    for start in range(0, len(indexes), BULK_CHUNK_SIZE):
+        chunk = indexes[start:start + BULK_CHUNK_SIZE]
+        errors: Dict[int, str] = {}
         
-        elif path == 'products' and method == 'PUT':
-            body_data = json.loads(event.get('body', '{}'))
-            product_id = body_data.get('id')
-            
-            cursor.execute(f'''
-                UPDATE "{SCHEMA}"."products" 
-                SET name = %s, description = %s, price = %s, category = %s, stock = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-                RETURNING id, name, description, price, category, stock, image_url
-            ''', (
-                body_data.get('name'),
-                body_data.get('description'),
-                body_data.get('price'),
-                body_data.get('category'),
-                body_data.get('stock'),
-                product_id
-            ))
-            
-            product = cursor.fetchone()
+        try:
+            by_sku = apply_product_chunk(cursor, [normalized[i] for i in chunk])
             conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'product': {
-                        'id': product['id'],
-                        'name': product['name'],
-                        'description': product['description'],
-                        'price': float(product['price']),
-                        'category': product['category'],
-                        'stock': product['stock'],
-                        'image': product['image_url']
-                    }
-                }),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'products' and method == 'DELETE':
-            product_id = event.get('queryStringParameters', {}).get('id')
-            
-            cursor.execute(f'UPDATE "{SCHEMA}"."products" SET status = %s WHERE id = %s', ('deleted', product_id))
+        except psycopg2.Error:
+            conn.rollback()
+            # Строка, которую отклонила база, не должна терять весь пакет: повтор по одной строке
+            by_sku = {}
+            for i in chunk:
+                cursor.execute('SAVEPOINT bulk_row')
+                try:
+                    by_sku.update(apply_product_chunk(cursor, [normalized[i]]))
+                    cursor.execute('RELEASE SAVEPOINT bulk_row')
+                except psycopg2.Error as e:
+                    cursor.execute('ROLLBACK TO SAVEPOINT bulk_row')
+                    errors[i] = str(e).strip()
             conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'orders' and method == 'GET':
-            status_filter = event.get('queryStringParameters', {}).get('status', '')
-            
-            query_parts = [f'SELECT o.id, o.order_number, o.customer_id, o.status, o.total_amount, o.items_count, o.created_at FROM "{SCHEMA}"."orders" o WHERE 1=1']
-            params = []
-            
-            if status_filter and status_filter != 'all':
-                query_parts.append(' AND o.status = %s')
-                params.append(status_filter)
-            
-            query_parts.append(' ORDER BY o.created_at DESC')
-            query = ''.join(query_parts)
-            
-            cursor.execute(query, tuple(params))
-            orders_data = cursor.fetchall()
-            
-            cursor.execute(f'SELECT id, name, email FROM "{SCHEMA}"."customers"')
-            customers_map = {c['id']: c for c in cursor.fetchall()}
-            
-            orders = []
-            for o in orders_data:
-                customer = customers_map.get(o['customer_id'], {})
-                orders.append({
-                    'id': o['order_number'],
-                    'customerId': o['customer_id'],
-                    'customerName': customer.get('name', ''),
-                    'customerEmail': customer.get('email', ''),
-                    'status': o['status'],
-                    'total': float(o['total_amount']),
-                    'items': o['items_count'],
-                    'marketplace': '',
-                    'date': o['created_at'].strftime('%d.%m.%Y') if o['created_at'] else ''
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'orders': orders}),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'customers' and method == 'GET':
-            cursor.execute(f'''
-                SELECT id, name, email, phone, avatar_url, total_spent, 
-                       total_orders, status, created_at
-                FROM "{SCHEMA}"."customers"
-                ORDER BY total_spent DESC
-            ''')
-            customers = cursor.fetchall()
-            
-            result = []
-            for c in customers:
-                result.append({
-                    'id': c['id'],
-                    'name': c['name'],
-                    'email': c['email'],
-                    'phone': c['phone'],
-                    'avatar': c['avatar_url'],
-                    'totalSpent': float(c['total_spent']) if c['total_spent'] else 0,
-                    'totalOrders': c['total_orders'],
-                    'status': c['status'],
-                    'joinedDate': c['created_at'].strftime('%d.%m.%Y') if c['created_at'] else ''
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'customers': result}),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'marketplaces' and method == 'GET':
-            cursor.execute(f'SELECT id, name, slug, logo_url, country, api_available, status FROM "{SCHEMA}"."marketplaces" WHERE status = %s ORDER BY name', ('active',))
-            marketplaces = cursor.fetchall()
-            
-            cursor.execute(f'SELECT marketplace_id, api_key, seller_id, store_url, is_active FROM "{SCHEMA}"."user_marketplace_integrations" WHERE user_id = %s', (user_id,))
-            integrations_map = {i['marketplace_id']: i for i in cursor.fetchall()}
-            
-            result = []
-            for m in marketplaces:
-                integration = integrations_map.get(m['id'])
-                result.append({
-                    'id': m['id'],
-                    'name': m['name'],
-                    'slug': m['slug'],
-                    'logo': m['logo_url'],
-                    'country': m['country'],
-                    'apiAvailable': m['api_available'],
-                    'connected': integration is not None and integration.get('is_active', False),
-                    'apiKey': integration.get('api_key', '') if integration else '',
-                    'sellerId': integration.get('seller_id', '') if integration else '',
-                    'storeUrl': integration.get('store_url', '') if integration else ''
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'marketplaces': result}),
-                'isBase64Encoded': False
-            }
         
-        elif path == 'marketplaces/connect' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            marketplace_id = body_data.get('marketplaceId')
-            api_key = body_data.get('apiKey', '')
-            api_secret = body_data.get('apiSecret', '')
-            seller_id = body_data.get('sellerId', '')
-            store_url = body_data.get('storeUrl', '')
-            
-            cursor.execute(f'''
-                SELECT id FROM "{SCHEMA}"."user_marketplace_integrations" 
-                WHERE user_id = %s AND marketplace_id = %s
-            ''', (user_id, marketplace_id))
-            existing = cursor.fetchone()
-            
-            if existing:
-                cursor.execute(f'''
-                    UPDATE "{SCHEMA}"."user_marketplace_integrations"
-                    SET api_key = %s, api_secret = %s, seller_id = %s, store_url = %s, 
-                        is_active = true, connected_at = CURRENT_TIMESTAMP
-                    WHERE user_id = %s AND marketplace_id = %s
-                ''', (api_key, api_secret, seller_id, store_url, user_id, marketplace_id))
+        for i in chunk:
+            sku = normalized[i]['sku']
+            if i in errors:
+                results[i].update({'sku': sku, 'status': 'error', 'error': errors[i]})
             else:
-                cursor.execute(f'''
-                    INSERT INTO "{SCHEMA}"."user_marketplace_integrations" 
-                    (user_id, marketplace_id, api_key, api_secret, seller_id, store_url, is_active, connected_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, true, CURRENT_TIMESTAMP)
-                ''', (user_id, marketplace_id, api_key, api_secret, seller_id, store_url))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'message': 'Marketplace connected successfully'}),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'marketplaces/disconnect' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            marketplace_id = body_data.get('marketplaceId')
-            
-            cursor.execute(f'''
-                UPDATE "{SCHEMA}"."user_marketplace_integrations"
-                SET is_active = false
-                WHERE user_id = %s AND marketplace_id = %s
-            ''', (user_id, marketplace_id))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'message': 'Marketplace disconnected successfully'}),
-                'isBase64Encoded': False
-            }
-        
-        elif path == 'analytics' and method == 'GET':
-            cursor.execute(f'SELECT COALESCE(SUM(total_amount), 0) as total_revenue, COUNT(*) as total_orders FROM "{SCHEMA}"."orders"')
-            stats = cursor.fetchone()
-            
-            cursor.execute(f'SELECT COUNT(*) as count FROM "{SCHEMA}"."products" WHERE status != %s', ('deleted',))
-            products_count = cursor.fetchone()['count']
-            
-            cursor.execute(f'SELECT COUNT(*) as count FROM "{SCHEMA}"."customers"')
-            customers_count = cursor.fetchone()['count']
-            
-            cursor.execute(f'''
-                SELECT date, revenue, orders_count, new_customers
-                FROM "{SCHEMA}"."sales_analytics"
-                ORDER BY date DESC
-                LIMIT 7
-            ''')
-            analytics_data = cursor.fetchall()
-            
-            chart_data = []
-            for row in reversed(list(analytics_data)):
-                chart_data.append({
-                    'date': row['date'].strftime('%d.%m'),
-                    'revenue': float(row['revenue']),
-                    'orders': row['orders_count'],
-                    'customers': row['new_customers']
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'stats': {
-                        'revenue': float(stats['total_revenue']) if stats['total_revenue'] else 0,
-                        'orders': stats['total_orders'],
-                        'products': products_count,
-                        'customers': customers_count
-                    },
-                    'chartData': chart_data
-                }),
-                'isBase64Encoded': False
-            }
-        
+                results[i].update({'sku': sku, **by_sku.get(sku, {'status': 'not_found'})})
+    
+    return results
+
+IMPORT_COPY_BATCH = 5000
+IMPORT_MAX_REJECTED = 100
+
+IMPORT_COLUMNS = {
+    'sku': ('sku', 'артикул', 'артикул продавца', 'offer_id', 'vendor code', 'vendor_code'),
+    'name': ('name', 'название', 'наименование', 'название товара', 'title'),
+    'price': ('price', 'цена', 'цена, руб.', 'цена продажи'),
+    'stock': ('stock', 'остаток', 'остатки', 'количество', 'quantity'),
+    'category': ('category', 'категория'),
+    'description': ('description', 'описание'),
+    'costPrice': ('cost_price', 'costprice', 'себестоимость'),
+    'image': ('image', 'image_url', 'фото', 'изображение')
+}
+IMPORT_HEADER_MAP = {alias: field for field, aliases in IMPORT_COLUMNS.items() for alias in aliases}
+
+def normalize_number(value: Any) -> Any:
+    if isinstance(value, (int, float)) or value is None:
+        return value
+    cleaned = re.sub(r'[^0-9,.\-]', '', str(value))
+    if '.' in cleaned and ',' in cleaned:
+        # 1.234.567,89 или 1,234,567.89: десятичный разделитель - последний из двух
+        thousands = '.' if cleaned.rfind(',') > cleaned.rfind('.') else ','
+        cleaned = cleaned.replace(thousands, '')
+    elif cleaned.count('.') > 1 or cleaned.count(',') > 1:
+        # Повторяющийся разделитель - разделитель тысяч: 1.000.000, 1,000,000
+        cleaned = cleaned.replace('.', '').replace(',', '')
+    return cleaned.replace(',', '.') or None
+
+# Байты, которые не удалось декодировать, сохраняются как суррогаты и отклоняют только свою строку
+UNDECODABLE = re.compile('[\udc80-\udcff]')
+
+def decode_import_text(data: bytes) -> str:
+    text = data.decode('utf-8', errors='surrogateescape')
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    undecodable = len(UNDECODABLE.findall(text))
+    if undecodable:
+        # Файл в cp1251 почти не содержит корректных UTF-8 последовательностей
+        decoded = sum(1 for ch in text if ord(ch) > 127) - undecodable
+        if decoded < undecodable:
+            return data.decode('cp1251', errors='surrogateescape')
+    return text
+
+def iter_csv_rows(data: bytes) -> Iterator[List[str]]:
+    text = decode_import_text(data)
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(io.StringIO(text, newline=''), dialect)
+
+def iter_xlsx_rows(data: bytes) -> Iterator[List[Any]]:
+    from openpyxl import load_workbook
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ['' if v is None else v for v in row]
+    finally:
+        workbook.close()
+
+def iter_import_products(rows: Iterator[List[Any]]) -> Iterator[Tuple[int, Any]]:
+    header = next(rows, None)
+    if header is None:
+        return
+    fields = [IMPORT_HEADER_MAP.get(str(h).strip().lower()) for h in header]
+    if 'sku' not in fields or 'name' not in fields or 'price' not in fields:
+        raise ValueError('Header must contain sku, name and price columns')
+    
+    for line, values in enumerate(rows, start=2):
+        if not any(str(v).strip() for v in values):
+            continue
+        if any(isinstance(v, str) and UNDECODABLE.search(v) for v in values):
+            yield line, ValueError('line contains bytes that are not valid UTF-8 or cp1251')
+            continue
+        raw = {field: value for field, value in zip(fields, values) if field}
+        if isinstance(raw.get('sku'), float) and raw['sku'].is_integer():
+            raw['sku'] = int(raw['sku'])
+        for field in ('price', 'stock', 'costPrice'):
+            if field in raw:
+                raw[field] = normalize_number(raw[field])
+        try:
+            yield line, validate_product_row(raw)
+        except ValueError as e:
+            yield line, e
+
+def copy_import_batch(cursor, batch: List[Tuple[int, Dict[str, Any]]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line, r in batch:
+        writer.writerow([line, r['sku'], r['name'], r['description'], r['price'], r['cost_price'],
+                         r['category'], r['stock'], r['image_url']])
+    buffer.seek(0)
+    cursor.copy_expert('''
+        COPY products_import (line, sku, name, description, price, cost_price, category, stock, image_url)
+        FROM STDIN WITH (FORMAT csv)
+    ''', buffer)
+
+def import_products(conn, cursor, rows: Iterator[List[Any]]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    cursor.execute('''
+        CREATE TEMP TABLE products_import (
+            line INTEGER, sku VARCHAR(100), name VARCHAR(255), description TEXT, price NUMERIC(10, 2),
+            cost_price NUMERIC(10, 2), category VARCHAR(100), stock INTEGER, image_url VARCHAR(500)
+        ) ON COMMIT DROP
+    ''')
+    
+    read = 0
+    rejected: List[Dict[str, Any]] = []
+    rejected_count = 0
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    
+    for line, result in iter_import_products(rows):
+        read += 1
+        if isinstance(result, ValueError):
+            rejected_count += 1
+            if len(rejected) < IMPORT_MAX_REJECTED:
+                rejected.append({'line': line, 'error': str(result)})
+            continue
+        batch.append((line, result))
+        if len(batch) >= IMPORT_COPY_BATCH:
+            copy_import_batch(cursor, batch)
+            batch = []
+    if batch:
+        copy_import_batch(cursor, batch)
+    
+    cursor.execute(f'''
+        INSERT INTO "{SCHEMA}"."products" (sku, name, description, price, cost_price, category, stock, image_url)
+        SELECT DISTINCT ON (sku) sku, name, description, price, cost_price, category, stock, image_url
+        FROM products_import
+        ORDER BY sku, line DESC
+        ON CONFLICT (sku) DO UPDATE SET
+            name = EXCLUDED.name, description = EXCLUDED.description, price = EXCLUDED.price,
+            cost_price = EXCLUDED.cost_price, category = EXCLUDED.category, stock = EXCLUDED.stock,
+            image_url = EXCLUDED.image_url, status = 'active', deleted_at = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) as inserted
+    ''')
+    merged = cursor.fetchall()
+    conn.commit()
+    
+    inserted = sum(1 for row in merged if row['inserted'])
+    elapsed = time.perf_counter() - started
+    
+    return {
+        'rowsRead': read,
+        'inserted': inserted,
+        'updated': len(merged) - inserted,
+        'rejectedCount': rejected_count,
+        'rejected': rejected,
+        'durationMs': round(elapsed * 1000),
+        'rowsPerSecond': round(read / elapsed) if elapsed > 0 else read
+    }
+
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 500
+
+def order_summary(o: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': o['order_number'],
+        'customerId': o['customer_id'],
+        'customerName': o['customer_name'] or '',
+        'customerEmail': o['customer_email'] or '',
+        'status': o['status'],
+        'total': float(o['total_amount']),
+        'items': o['items_count'],
+        'marketplace': o['marketplace_name'] or '',
+        'date': o['created_at'].strftime('%d.%m.%Y') if o['created_at'] else ''
+    }
+
+EXPORT_PAGE_SIZE = 20000
+EXPORT_MAX_PAGE_SIZE = 50000
+EXPORT_FETCH_SIZE = 2000
+EXPORT_COLUMNS = {
+    'orders': ('id', 'order_number', 'customer_id', 'marketplace_id', 'status', 'fulfillment_type',
+               'total_amount', 'items_count', 'tracking_number', 'shipping_address', 'created_at',
+               'shipped_at', 'updated_at'),
+    'products': ('id', 'sku', 'name', 'description', 'price', 'cost_price', 'category', 'stock',
+                 'status', 'image_url', 'created_at', 'updated_at'),
+    'customers': ('id', 'name', 'email', 'phone', 'total_spent', 'total_orders', 'status',
+                  'created_at', 'updated_at')
+}
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def parse_export_bound(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+def export_page(conn, entity: str, columns: List[str], file_format: str, compress: bool, after_id: int,
+                limit: int, date_from: Optional[datetime], date_to: Optional[datetime]) -> Tuple[bytes, Optional[int]]:
+    where_clauses, params = ['id > %s'], [after_id]
+    if date_from:
+        where_clauses.append('created_at >= %s')
+        params.append(date_from)
+    if date_to:
+        where_clauses.append('created_at < %s')
+        params.append(date_to)
+    
+    raw = io.BytesIO()
+    output = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) if compress else raw
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text) if file_format == 'csv' else None
+    # Заголовок CSV только в первой странице, чтобы страницы можно было склеить в один файл
+    if writer and after_id == 0:
+        writer.writerow(columns)
+    
+    # Страница ограничена limit строками по ключу id: память не зависит от размера выгрузки
+    cursor = conn.cursor()
+    last_id, written, has_more = None, 0, False
+    try:
+        cursor.execute(f'''
+            SELECT id, {', '.join(columns)} FROM "{SCHEMA}"."{entity}"
+            WHERE {' AND '.join(where_clauses)}
+            ORDER BY id
+            LIMIT %s
+        ''', params + [limit + 1])
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if written == limit:
+                    has_more = True
+                    break
+                values = [export_value(v) for v in row[1:]]
+                if writer:
+                    writer.writerow(values)
+                else:
+                    text.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + '\n')
+                last_id = row[0]
+                written += 1
+    finally:
         cursor.close()
-        conn.close()
-        
-        return {
-            'statusCode': 404,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Endpoint not found'}),
-            'isBase64Encoded': False
+    
+    text.flush()
+    text.detach()
+    if compress:
+        output.close()
+    return raw.getvalue(), last_id if has_more else None
+
+CUSTOMERS_PAGE_SIZE = 50
+CUSTOMERS_MAX_PAGE_SIZE = 500
+RECOMPUTE_CHUNK_SIZE = 1000
+RECOMPUTE_PAGE_SIZE = 10000
+RECOMPUTE_MAX_PAGE_SIZE = 50000
+
+def recompute_customer_totals(cursor, after_id: int, chunk_size: int) -> Tuple[Optional[int], int]:
+    # Сверка с заказами для следующей порции клиентов; триггер на orders ведет суммы между сверками.
+    # Заказы из отключенных секций учтены в customer_archived_totals
+    cursor.execute(f'''
+        SELECT id FROM "{SCHEMA}"."customers"
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+    ''', (after_id, chunk_size))
+    ids = [row['id'] for row in cursor.fetchall()]
+    if not ids:
+        return None, 0
+    
+    cursor.execute(f'''
+        WITH totals AS (
+            SELECT c.id,
+                   COALESCE(SUM(o.total_amount) FILTER (WHERE o.status NOT IN ('cancelled', 'returned')), 0)
+                       + COALESCE(MAX(a.total_spent), 0) as total_spent,
+                   COUNT(o.id) FILTER (WHERE o.status NOT IN ('cancelled', 'returned'))
+                       + COALESCE(MAX(a.total_orders), 0) as total_orders
+            FROM "{SCHEMA}"."customers" c
+            LEFT JOIN "{SCHEMA}"."customer_archived_totals" a ON a.customer_id = c.id
+            LEFT JOIN "{SCHEMA}"."orders" o ON o.customer_id = c.id
+            WHERE c.id = ANY(%s)
+            GROUP BY c.id
+        )
+        UPDATE "{SCHEMA}"."customers" c
+        SET total_spent = t.total_spent, total_orders = t.total_orders, updated_at = CURRENT_TIMESTAMP
+        FROM totals t
+        WHERE c.id = t.id AND (c.total_spent <> t.total_spent OR c.total_orders <> t.total_orders)
+    ''', (ids,))
+    return ids[-1], cursor.rowcount
+
+# Минимальный срок хранения удаленных товаров: olderThanDays может только продлить его
+PURGE_AFTER_DAYS = 90
+PURGE_BATCH_SIZE = 500
+
+def purge_deleted_products(cursor, older_than_days: int, batch_size: int) -> int:
+    # Товары из заказов остаются в products: на них ссылается order_items
+    cursor.execute(f'''
+        SELECT p.id FROM "{SCHEMA}"."products" p
+        WHERE p.status = 'deleted'
+          AND p.deleted_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+          AND NOT EXISTS (SELECT 1 FROM "{SCHEMA}"."order_items" oi WHERE oi.product_id = p.id)
+        ORDER BY p.deleted_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ''', (older_than_days, batch_size))
+    ids = [row['id'] for row in cursor.fetchall()]
+    if not ids:
+        return 0
+    
+    cursor.execute(f'DELETE FROM "{SCHEMA}"."marketplace_products" WHERE product_id = ANY(%s)', (ids,))
+    cursor.execute(f'DELETE FROM "{SCHEMA}"."replenishment_plan" WHERE product_id = ANY(%s)', (ids,))
+    cursor.execute(f'''
+        WITH moved AS (
+            DELETE FROM "{SCHEMA}"."products" p
+            WHERE p.id = ANY(%s)
+            RETURNING p.*
+        )
+        INSERT INTO "{SCHEMA}"."products_archive" (id, data, deleted_at)
+        SELECT m.id, to_jsonb(m) - 'search_vector', m.deleted_at FROM moved m
+        ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, deleted_at = EXCLUDED.deleted_at,
+            archived_at = CURRENT_TIMESTAMP
+    ''', (ids,))
+    return len(ids)
+
+PARTITIONS_AHEAD_MONTHS = 3
+# Нижняя граница хранения: keepMonths может только продлить ее
+PARTITIONS_KEEP_MONTHS = 36
+
+def maintain_order_partitions(cursor, months_ahead: int, keep_months: int) -> Tuple[int, int]:
+    # Секции orders/order_items на будущие месяцы создаются заранее, чтобы заказы не копились в секции по умолчанию
+    cursor.execute(f'SELECT "{SCHEMA}".orders_ensure_partitions(%s) as created', (months_ahead,))
+    created = cursor.fetchone()['created']
+    cursor.execute(f'SELECT "{SCHEMA}".orders_detach_partitions(%s) as detached', (keep_months,))
+    detached = cursor.fetchone()['detached']
+    return created, detached
+
+CHANGE_TABLES = ('orders', 'products', 'customers', 'marketplace_products')
+CHANGES_PAGE_SIZE = 1000
+CHANGES_MAX_PAGE_SIZE = 5000
+CHANGES_KEEP_DAYS = 7
+CHANGES_PRUNE_BATCH = 5000
+
+ChangeCursor = Tuple[int, int]
+
+def change_watermark(cursor) -> int:
+    # Транзакции младше xmin снимка завершены: их строки change_log окончательны
+    cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot()) as xmin')
+    return cursor.fetchone()['xmin']
+
+def get_changes(cursor, since: ChangeCursor, tables: List[str], marketplace_id: Optional[int], limit: int) -> Dict[str, Any]:
+    # Версии пишут триггеры change_log на самих таблицах, поэтому в ленту попадает любой путь записи.
+    # Курсор - пара (txid, version): клиент уже получил все строки не новее этой пары;
+    # строки транзакций, которые еще могут зафиксироваться, отдаются только после их завершения
+    mp_sql, mp_params = '', []
+    if marketplace_id is not None:
+        mp_sql = 'AND (marketplace_id IS NULL OR marketplace_id = %s)'
+        mp_params = [marketplace_id]
+    
+    watermark = change_watermark(cursor)
+    cursor.execute(f'''
+        SELECT t.table_name,
+               (SELECT MAX(c.txid) FROM "{SCHEMA}"."change_log" c
+                WHERE c.table_name = t.table_name AND c.txid < %s {mp_sql}) as version
+        FROM unnest(%s::varchar[]) as t(table_name)
+    ''', [watermark] + mp_params + [tables])
+    versions = {row['table_name']: row['version'] or 0 for row in cursor.fetchall()}
+    
+    # Клиент отстал дальше, чем хранится лента: ему нужна полная перезагрузка списков
+    cursor.execute(f'SELECT pruned_txid FROM "{SCHEMA}"."change_log_horizon"')
+    horizon = cursor.fetchone()
+    reset = since[0] > 0 and horizon is not None and since[0] <= horizon['pruned_txid']
+    
+    cursor.execute(f'''
+        SELECT table_name, row_key,
+               (array_agg(txid ORDER BY txid DESC, version DESC))[1] as txid,
+               (array_agg(version ORDER BY txid DESC, version DESC))[1] as version,
+               (array_agg(op ORDER BY txid DESC, version DESC))[1] as op
+        FROM (
+            SELECT txid, version, table_name, row_key, op
+            FROM "{SCHEMA}"."change_log"
+            WHERE (txid, version) > (%s, %s) AND txid < %s AND table_name = ANY(%s) {mp_sql}
+            ORDER BY txid, version
+            LIMIT %s
+        ) c
+        GROUP BY table_name, row_key
+        ORDER BY 3, 4
+    ''', [since[0], since[1], watermark, tables] + mp_params + [limit])
+    rows = cursor.fetchall()
+    
+    has_more = False
+    if rows:
+        cursor.execute(f'''
+            SELECT EXISTS (
+                SELECT 1 FROM "{SCHEMA}"."change_log"
+                WHERE (txid, version) > (%s, %s) AND txid < %s AND table_name = ANY(%s) {mp_sql}
+            ) as more
+        ''', [rows[-1]['txid'], rows[-1]['version'], watermark, tables] + mp_params)
+        has_more = cursor.fetchone()['more']
+    
+    changes = {name: {'changed': [], 'deleted': []} for name in tables}
+    for row in rows:
+        changes[row['table_name']]['deleted' if row['op'] == 'D' else 'changed'].append(row['row_key'])
+    
+    next_cursor = (rows[-1]['txid'], rows[-1]['version']) if has_more else (watermark, 0)
+    return {
+        'since': since[0],
+        'version': next_cursor[0],
+        'sinceVersion': next_cursor[1],
+        'versions': versions,
+        'changes': changes,
+        'hasMore': has_more,
+        'reset': reset
+    }
+
+def prune_change_log(cursor, keep_days: int, batch_size: int) -> int:
+    # Старшая удаленная транзакция запоминается, чтобы отставшие клиенты получили reset
+    cursor.execute(f'''
+        WITH pruned AS (
+            DELETE FROM "{SCHEMA}"."change_log"
+            WHERE version IN (
+                SELECT version FROM "{SCHEMA}"."change_log"
+                WHERE changed_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                ORDER BY version
+                LIMIT %s
+            )
+            RETURNING txid
+        ), horizon AS (
+            UPDATE "{SCHEMA}"."change_log_horizon"
+            SET pruned_txid = GREATEST(pruned_txid, (SELECT COALESCE(MAX(txid), 0) FROM pruned))
+        )
+        SELECT COUNT(*) as pruned FROM pruned
+    ''', (keep_days, batch_size))
+    return cursor.fetchone()['pruned']
+
+# Оповещения шлет триггер trg_orders_notify_change на orders (V0019) при любой записи в заказы
+ORDERS_CHANNEL = 'orders_events'
+STREAM_TIMEOUT = 25
+STREAM_MAX_TIMEOUT = 28
+STREAM_BATCH_SIZE = 100
+
+def fetch_changed_orders(cursor, since: ChangeCursor, marketplace_id: Optional[int]) -> Tuple[ChangeCursor, List[Dict[str, Any]]]:
+    # Заказы ищутся по номеру через реестр order_numbers, чтобы обращаться только к нужной секции
+    mp_sql, mp_params = '', []
+    if marketplace_id is not None:
+        mp_sql = 'AND cl.marketplace_id = %s'
+        mp_params = [marketplace_id]
+    
+    watermark = change_watermark(cursor)
+    cursor.execute(f'''
+        SELECT c.txid, c.version, o.order_number, o.customer_id, o.status, o.total_amount, o.items_count,
+               o.created_at, cu.name as customer_name, cu.email as customer_email, m.name as marketplace_name
+        FROM (
+            SELECT cl.row_key,
+                   (array_agg(cl.txid ORDER BY cl.txid DESC, cl.version DESC))[1] as txid,
+                   (array_agg(cl.version ORDER BY cl.txid DESC, cl.version DESC))[1] as version
+            FROM "{SCHEMA}"."change_log" cl
+            WHERE cl.table_name = 'orders' AND (cl.txid, cl.version) > (%s, %s) AND cl.txid < %s
+              AND cl.op <> 'D' {mp_sql}
+            GROUP BY cl.row_key
+            ORDER BY 2, 3
+            LIMIT %s
+        ) c
+        LEFT JOIN "{SCHEMA}"."order_numbers" n ON n.order_number = c.row_key
+        LEFT JOIN "{SCHEMA}"."orders" o ON o.id = n.order_id AND o.created_at = n.created_at
+        LEFT JOIN "{SCHEMA}"."customers" cu ON cu.id = o.customer_id
+        LEFT JOIN "{SCHEMA}"."marketplaces" m ON m.id = o.marketplace_id
+        ORDER BY c.txid, c.version
+    ''', [since[0], since[1], watermark] + mp_params + [STREAM_BATCH_SIZE])
+    rows = cursor.fetchall()
+    
+    # Полная пачка - дальше могут быть еще изменения, продолжаем с последней пары; иначе до водяной отметки
+    if len(rows) >= STREAM_BATCH_SIZE:
+        next_cursor = (rows[-1]['txid'], rows[-1]['version'])
+    else:
+        next_cursor = (watermark, 0)
+    # Заказ, номер которого с тех пор сменился, двигает курсор, но в ответ не попадает
+    return next_cursor, [order_summary(row) for row in rows if row['order_number'] is not None]
+
+def wait_for_orders(conn, cursor, since: Optional[ChangeCursor], marketplace_id: Optional[int],
+                    timeout: float) -> Dict[str, Any]:
+    # Среда выполнения отдает тело ответа целиком, поэтому вместо SSE - долгий опрос:
+    # соединение слушает orders_events, а запрос к заказам повторяется только после оповещения.
+    # Заказ виден, когда завершились все более ранние транзакции (см. change_watermark),
+    # поэтому при параллельном длинном импорте он может прийти позже оповещения
+    conn.autocommit = True
+    cursor.execute(f'LISTEN {ORDERS_CHANNEL}')
+    
+    if since is None:
+        since = (change_watermark(cursor), 0)
+    
+    deadline = time.monotonic() + timeout
+    next_cursor, orders = fetch_changed_orders(cursor, since, marketplace_id)
+    while not orders:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not select.select([conn], [], [], remaining)[0]:
+            break
+        conn.poll()
+        if not conn.notifies:
+            continue
+        conn.notifies.clear()
+        next_cursor, orders = fetch_changed_orders(cursor, since, marketplace_id)
+    
+    cursor.execute(f'UNLISTEN {ORDERS_CHANNEL}')
+    return {'orders': orders, 'version': next_cursor[0], 'sinceVersion': next_cursor[1], 'timedOut': not orders}
+
+def auth_login_post(req: Request) -> Dict[str, Any]:
+    cursor = req.cursor
+    
+    body_data = req.json()
+    email = body_data.get('email')
+    
+    cursor.execute(f'SELECT id, email, full_name, company_name, subscription_plan FROM "{SCHEMA}"."users" WHERE email = %s', (email,))
+    user = cursor.fetchone()
+    
+    if user:
+        return json_response({
+            'user': {
+                'id': user['id'],
+                'email': user['email'],
+                'fullName': user['full_name'],
+                'companyName': user['company_name'],
+                'plan': user['subscription_plan']
+            }
+        })
+    
+    return json_response({'error': 'Invalid credentials'}, 401)
+
+
+def products_get(req: Request) -> Dict[str, Any]:
+    cursor = req.cursor
+    
+    query_params = req.query
+    category = query_params.get('category', '')
+    search = query_params.get('q', '').strip()
+    page = max(int(query_params.get('page', '1')), 1)
+    limit = min(max(int(query_params.get('limit', str(PRODUCTS_PAGE_SIZE))), 1), PRODUCTS_MAX_PAGE_SIZE)
+    include_deleted = query_params.get('includeDeleted') == 'true'
+    
+    found = search_products(cursor, search, category, page, limit, include_deleted=include_deleted)
+    fuzzy = False
+    if search and found['total'] == 0:
+        found = search_products(cursor, search, category, page, limit, fuzzy=True, include_deleted=include_deleted)
+        fuzzy = True
+    
+    return json_response({
+        'products': found['products'],
+        'categories': [f['category'] for f in found['facets']],
+        'facets': found['facets'],
+        'total': found['total'],
+        'page': page,
+        'limit': limit,
+        'fuzzy': fuzzy
+    })
+
+
+def products_post(req: Request) -> Dict[str, Any]:
+    conn, cursor = req.conn, req.cursor
+    
+    body_data = req.json()
+    
+    cursor.execute(f'''
+        INSERT INTO "{SCHEMA}"."products" (name, description, price, category, stock, image_url)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id, name, description, price, category, stock, image_url
+    ''', (
+        body_data.get('name'),
+        body_data.get('description', ''),
+        body_data.get('price'),
+        body_data.get('category'),
+        body_data.get('stock', 0),
+        body_data.get('image', 'https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=400')
+    ))
+    
+    product = cursor.fetchone()
+    conn.commit()
+    
+    return json_response({
+        'product': {
+            'id': product['id'],
+            'name': product['name'],
+            'description': product['description'],
+            'price': float(product['price']),
+            'category': product['category'],
+            'stock': product['stock'],
+            'image': product['image_url']
         }
-        
-    except Exception as e:
-        import traceback
-        error_details = {
-            'error': str(e),
-            'type': type(e).__name__,
-            'traceback': traceback.format_exc()
+    }, 201)
+
+
+def products_put(req: Request) -> Dict[str, Any]:
+    conn, cursor = req.conn, req.cursor
+    
+    body_data = req.json()
+    product_id = body_data.get('id')
+    
+    cursor.execute(f'''
+        UPDATE "{SCHEMA}"."products" 
+        SET name = %s, description = %s, price = %s, category = %s, stock = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+        RETURNING id, name, description, price, category, stock, image_url
+    ''', (
+        body_data.get('name'),
+        body_data.get('description'),
+        body_data.get('price'),
+        body_data.get('category'),
+        body_data.get('stock'),
+        product_id
+    ))
+    
+    product = cursor.fetchone()
+    conn.commit()
+    
+    return json_response({
+        'product': {
+            'id': product['id'],
+            'name': product['name'],
+            'description': product['description'],
+            'price': float(product['price']),
+            'category': product['category'],
+            'stock': product['stock'],
+            'image': product['image_url']
         }
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(error_details),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+    })
+
+
+def products_delete(req: Request) -> Dict[str, Any]:
+    conn, cursor = req.conn, req.cursor
+    
+    product_id = req.query.get('id')
+    
+    cursor.execute(f'''
+        UPDATE "{SCHEMA}"."products"
+        SET status = %s, deleted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status <> %s
+    ''', ('deleted', product_id, 'deleted'))
+    conn.commit()
+    
+    return json_response({'success': True})
+
+
+def products_bulk_post(req: Request) -> Dict[str, Any]:
+    content_type = (req.header('Content-Type') or '').lower()
+    try:
+        raw_rows = parse_bulk_body(req.event.get('body') or '[]', content_type)
+    except ValueError as e:
+        return json_response({'error': f'Invalid JSON: {e}'}, 400)
+    
+    if not isinstance(raw_rows, list) or len(raw_rows) > BULK_MAX_ROWS:
+        return json_response({'error': f'Expected an array of up to {BULK_MAX_ROWS} products'}, 400)
+    
+    results = apply_bulk_products(req.conn, req.cursor, raw_rows)
+    
+    summary: Dict[str, int] = {}
+    for r in results:
+        summary[r['status']] = summary.get(r['status'], 0) + 1
+    
+    return json_response({'summary': summary, 'results': results})
+
+
+def products_import_post(req: Request) -> Dict[str, Any]:
+    conn, cursor = req.conn, req.cursor
+    
+    query_params = req.query
+    content_type = (req.header('Content-Type') or '').lower()
+    body = req.event.get('body') or ''
+    data = base64.b64decode(body) if req.event.get('isBase64Encoded') else body.encode()
+    
+    file_format = query_params.get('format') or ('xlsx' if 'spreadsheetml' in content_type else 'csv')
+    rows = iter_xlsx_rows(data) if file_format == 'xlsx' else iter_csv_rows(data)
+    
+    try:
+        report = import_products(conn, cursor, rows)
+    except ValueError as e:
+        conn.rollback()
+        return json_response({'error': str(e)}, 400)
+    
+    return json_response(report)
+
+
+def export_get(req: Request) -> Dict[str, Any]:
+    query_params = req.query
+    entity = query_params.get('entity', '')
+    file_format = query_params.get('format', 'csv')
+    compress = query_params.get('gzip') == 'true'
+    allowed = EXPORT_COLUMNS.get(entity)
+    columns = [c for c in query_params.get('columns', '').split(',') if c] or list(allowed or [])
+    
+    if not allowed or file_format not in ('csv', 'ndjson') or any(c not in allowed for c in columns):
+        return json_response({'error': 'Unknown entity, format or column'}, 400)
+    
+    try:
+        after_id = max(int(query_params.get('afterId', '0')), 0)
+        limit = min(max(int(query_params.get('limit', str(EXPORT_PAGE_SIZE))), 1), EXPORT_MAX_PAGE_SIZE)
+        date_from = parse_export_bound(query_params.get('from'))
+        date_to = parse_export_bound(query_params.get('to'))
+    except ValueError:
+        return json_response({'error': 'afterId and limit must be integers, from and to ISO dates'}, 400)
+    
+    data, next_cursor = export_page(req.conn, entity, columns, file_format, compress, after_id, limit, date_from, date_to)
+    
+    filename = f'{entity}.{file_format}' + ('.gz' if compress else '')
+    content_type = 'text/csv; charset=utf-8' if file_format == 'csv' else 'application/x-ndjson'
+    headers = {
+        'Content-Type': 'application/gzip' if compress else content_type,
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor'
+    }
+    # Тело - сам файл, поэтому курсор следующей страницы (afterId) передается заголовком
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = str(next_cursor)
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': base64.b64encode(data).decode() if compress else data.decode('utf-8'),
+        'isBase64Encoded': compress
+    }
+
+
+MAINTENANCE_PERMISSION = 'manage_settings'
+
+def require_permission(req: Request, permission: str) -> Optional[Dict[str, Any]]:
+    # Обслуживающие маршруты требуют токен с правом даже при выключенном AUTH_REQUIRED
+    claims = get_request_claims(req.event)
+    if claims is None:
+        return json_response({'error': 'Authorization required'}, 401)
+    if not has_permission(claims, permission):
+        return json_response({'error': 'Permission denied'}, 403)
+    return None
+
+
+def customers_recompute_post(req: Request) -> Dict[str, Any]:
+    denied = require_permission(req, MAINTENANCE_PERMISSION)
+    if denied:
+        return denied
+    
+    body_data = req.json()
+    try:
+        after_id = max(int(body_data.get('afterId', 0)), 0)
+        limit = min(max(int(body_data.get('limit', RECOMPUTE_PAGE_SIZE)), 1), RECOMPUTE_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return json_response({'error': 'afterId and limit must be integers'}, 400)
+    
+    # Один вызов сверяет не больше limit клиентов; планировщик повторяет вызов с nextCursor, пока он не null
+    conn, cursor = req.conn, req.cursor
+    updated = 0
+    remaining = limit
+    next_cursor: Optional[int] = after_id
+    while remaining > 0:
+        chunk_size = min(RECOMPUTE_CHUNK_SIZE, remaining)
+        next_cursor, changed = recompute_customer_totals(cursor, next_cursor, chunk_size)
+        conn.commit()
+        if next_cursor is None:
+            break
+        updated += changed
+        remaining -= chunk_size
+    
+    return json_response({'updated': updated, 'nextCursor': next_cursor})
+
+
+def products_purge_post(req: Request) -> Dict[str, Any]:
+    denied = require_permission(req, MAINTENANCE_PERMISSION)
+    if denied:
+        return denied
+    
+    body_data = req.json()
+    try:
+        older_than_days = int(body_data.get('olderThanDays', PURGE_AFTER_DAYS))
+        batch_size = min(max(int(body_data.get('batchSize', PURGE_BATCH_SIZE)), 1), PURGE_BATCH_SIZE)
+    except (TypeError, ValueError):
+        return json_response({'error': 'olderThanDays and batchSize must be integers'}, 400)
+    
+    if older_than_days < PURGE_AFTER_DAYS:
+        return json_response({'error': f'olderThanDays must be at least {PURGE_AFTER_DAYS}'}, 400)
+    
+    conn, cursor = req.conn, req.cursor
+    archived = 0
+    while True:
+        archived_batch = purge_deleted_products(cursor, older_than_days, batch_size)
+        conn.commit()
+        archived += archived_batch
+        if archived_batch < batch_size:
+            break
+    
+    return json_response({'archived': archived, 'olderThanDays': older_than_days})
+
+
+def orders_partitions_post(req: Request) -> Dict[str, Any]:
+    denied = require_permission(req, MAINTENANCE_PERMISSION)
+    if denied:
+        return denied
+    
+    body_data = req.json()
+    try:
+        months_ahead = max(int(body_data.get('monthsAhead', PARTITIONS_AHEAD_MONTHS)), 1)
+        keep_months = max(int(body_data.get('keepMonths', PARTITIONS_KEEP_MONTHS)), PARTITIONS_KEEP_MONTHS)
+    except (TypeError, ValueError):
+        return json_response({'error': 'monthsAhead and keepMonths must be integers'}, 400)
+    
+    conn, cursor = req.conn, req.cursor
+    created, detached = maintain_order_partitions(cursor, months_ahead, keep_months)
+    conn.commit()
+    
+    return json_response({'created': created, 'detached': detached, 'keepMonths': keep_months})
+
+
+def changes_get(req: Request) -> Dict[str, Any]:
+    cursor = req.cursor
+    
+    query_params = req.query
+    since = (max(int(query_params.get('since', '0')), 0), max(int(query_params.get('sinceVersion', '0')), 0))
+    limit = min(max(int(query_params.get('limit', str(CHANGES_PAGE_SIZE))), 1), CHANGES_MAX_PAGE_SIZE)
+    tables = [t for t in (query_params.get('tables') or ','.join(CHANGE_TABLES)).split(',') if t]
+    marketplace_id = query_params.get('marketplaceId')
+    
+    if any(t not in CHANGE_TABLES for t in tables):
+        return json_response({'error': f'tables must be a subset of: {", ".join(CHANGE_TABLES)}'}, 400)
+    
+    result = get_changes(cursor, since, tables, int(marketplace_id) if marketplace_id else None, limit)
+    
+    return json_response(result)
+
+
+def changes_prune_post(req: Request) -> Dict[str, Any]:
+    denied = require_permission(req, MAINTENANCE_PERMISSION)
+    if denied:
+        return denied
+    
+    body_data = req.json()
+    try:
+        keep_days = max(int(body_data.get('keepDays', CHANGES_KEEP_DAYS)), 1)
+    except (TypeError, ValueError):
+        return json_response({'error': 'keepDays must be an integer'}, 400)
+    
+    conn, cursor = req.conn, req.cursor
+    pruned = 0
+    while True:
+        pruned_batch = prune_change_log(cursor, keep_days, CHANGES_PRUNE_BATCH)
+        conn.commit()
+        pruned += pruned_batch
+        if pruned_batch < CHANGES_PRUNE_BATCH:
+            break
+    
+    return json_response({'pruned': pruned, 'keepDays': keep_days})
+
+
+def orders_stream_get(req: Request) -> Dict[str, Any]:
+    conn, cursor = req.conn, req.cursor
+    
+    query_params = req.query
+    since = query_params.get('since')
+    since_version = int(query_params.get('sinceVersion', '0'))
+    marketplace_id = query_params.get('marketplaceId')
+    timeout = min(max(float(query_params.get('timeout', str(STREAM_TIMEOUT))), 0), STREAM_MAX_TIMEOUT)
+    
+    result = wait_for_orders(conn, cursor, (int(since), since_version) if since else None,
+                             int(marketplace_id) if marketplace_id else None, timeout)
+    
+    return json_response(result, headers={'Cache-Control': 'no-store'})
+
+
+def orders_get(req: Request) -> Dict[str, Any]:
+    cursor = req.cursor
+    
+    query_params = req.query
+    status_filter = query_params.get('status', '')
+    page = max(int(query_params.get('page', '1')), 1)
+    limit = min(max(int(query_params.get('limit', str(ORDERS_PAGE_SIZE))), 1), ORDERS_MAX_PAGE_SIZE)
+    
+    where_sql, params = 'true', []
+    if status_filter and status_filter != 'all':
+        where_sql = 'o.status = %s'
+        params.append(status_filter)
+    
+    # Сначала страница заказов по индексу (status, created_at), затем клиенты только для нее
+    cursor.execute(f'''
+        SELECT o.order_number, o.customer_id, o.status, o.total_amount, o.items_count, o.created_at,
+               c.name as customer_name, c.email as customer_email, m.name as marketplace_name
+        FROM (
+            SELECT * FROM "{SCHEMA}"."orders" o
+            WHERE {where_sql}
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT %s OFFSET %s
+        ) o
+        LEFT JOIN "{SCHEMA}"."customers" c ON c.id = o.customer_id
+        LEFT JOIN "{SCHEMA}"."marketplaces" m ON m.id = o.marketplace_id
+        ORDER BY o.created_at DESC, o.id DESC
+    ''', params + [limit + 1, (page - 1) * limit])
+    orders_data = cursor.fetchall()
+    has_more = len(orders_data) > limit
+    
+    orders = [order_summary(o) for o in orders_data[:limit]]
+    
+    return json_response({'orders': orders, 'page': page, 'limit': limit, 'hasMore': has_more})
+
+
+def customers_get(req: Request) -> Dict[str, Any]:
+    cursor = req.cursor
+    
+    query_params = req.query
+    page = max(int(query_params.get('page', '1')), 1)
+    limit = min(max(int(query_params.get('limit', str(CUSTOMERS_PAGE_SIZE))), 1), CUSTOMERS_MAX_PAGE_SIZE)
+    
+    cursor.execute(f'''
+        SELECT id, name, email, phone, avatar_url, total_spent, 
+               total_orders, status, segment, created_at
+        FROM "{SCHEMA}"."customers"
+        ORDER BY total_spent DESC, id DESC
+        LIMIT %s OFFSET %s
+    ''', (limit, (page - 1) * limit))
+    customers = cursor.fetchall()
+    
+    result = []
+    for c in customers:
+        result.append({
+            'id': c['id'],
+            'name': c['name'],
+            'email': c['email'],
+            'phone': c['phone'],
+            'avatar': c['avatar_url'],
+            'totalSpent': float(c['total_spent']) if c['total_spent'] else 0,
+            'totalOrders': c['total_orders'],
+            'status': c['status'],
+            'segment': c['segment'],
+            'joinedDate': c['created_at'].strftime('%d.%m.%Y') if c['created_at'] else ''
+        })
+    
+    return json_response({'customers': result})
+
+
+def marketplaces_get(req: Request) -> Dict[str, Any]:
+    cursor = req.cursor
+    user_id = req.user_id
+    
+    cursor.execute(f'SELECT id, name, slug, logo_url, country, api_available, status FROM "{SCHEMA}"."marketplaces" WHERE status = %s ORDER BY name', ('active',))
+    marketplaces = cursor.fetchall()
+    
+    cursor.execute(f'SELECT marketplace_id, api_key, seller_id, store_url, is_active FROM "{SCHEMA}"."user_marketplace_integrations" WHERE user_id = %s', (user_id,))
+    integrations_map = {i['marketplace_id']: i for i in cursor.fetchall()}
+    
+    result = []
+    for m in marketplaces:
+        integration = integrations_map.get(m['id'])
+        result.append({
+            'id': m['id'],
+            'name': m['name'],
+            'slug': m['slug'],
+            'logo': m['logo_url'],
+            'country': m['country'],
+            'apiAvailable': m['api_available'],
+            'connected': integration is not None and integration.get('is_active', False),
+            'apiKey': integration.get('api_key', '') if integration else '',
+            'sellerId': integration.get('seller_id', '') if integration else '',
+            'storeUrl': integration.get('store_url', '') if integration else ''
+        })
+    
+    return json_response({'marketplaces': result})
+
+
+def marketplaces_connect_post(req: Request) -> Dict[str, Any]:
+    conn, cursor = req.conn, req.cursor
+    user_id = req.user_id
+    
+    body_data = req.json()
+    marketplace_id = body_data.get('marketplaceId')
+    api_key = body_data.get('apiKey', '')
+    api_secret = body_data.get('apiSecret', '')
+    seller_id = body_data.get('sellerId', '')
+    store_url = body_data.get('storeUrl', '')
+    
+    cursor.execute(f'''
+        SELECT id FROM "{SCHEMA}"."user_marketplace_integrations" 
+        WHERE user_id = %s AND marketplace_id = %s
+    ''', (user_id, marketplace_id))
+    existing = cursor.fetchone()
+    
+    if existing:
+        cursor.execute(f'''
+            UPDATE "{SCHEMA}"."user_marketplace_integrations"
+            SET api_key = %s, api_secret = %s, seller_id = %s, store_url = %s, 
+                is_active = true, connected_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s AND marketplace_id = %s
+        ''', (api_key, api_secret, seller_id, store_url, user_id, marketplace_id))
+    else:
+        cursor.execute(f'''
+            INSERT INTO "{SCHEMA}"."user_marketplace_integrations" 
+            (user_id, marketplace_id, api_key, api_secret, seller_id, store_url, is_active, connected_at)
+            VALUES (%s, %s, %s, %s, %s, %s, true, CURRENT_TIMESTAMP)
+        ''', (user_id, marketplace_id, api_key, api_secret, seller_id, store_url))
+    
+    conn.commit()
+    
+    return json_response({'success': True, 'message': 'Marketplace connected successfully'})
+
+
+def marketplaces_disconnect_post(req: Request) -> Dict[str, Any]:
+    conn, cursor = req.conn, req.cursor
+    user_id = req.user_id
+    
+    body_data = req.json()
+    marketplace_id = body_data.get('marketplaceId')
+    
+    cursor.execute(f'''
+        UPDATE "{SCHEMA}"."user_marketplace_integrations"
+        SET is_active = false
+        WHERE user_id = %s AND marketplace_id = %s
+    ''', (user_id, marketplace_id))
+    
+    conn.commit()
+    
+    return json_response({'success': True, 'message': 'Marketplace disconnected successfully'})
+
+
+def analytics_get(req: Request) -> Dict[str, Any]:
+    cursor = req.cursor
+    
+    cursor.execute(f'SELECT COALESCE(SUM(total_amount), 0) as total_revenue, COUNT(*) as total_orders FROM "{SCHEMA}"."orders"')
+    stats = cursor.fetchone()
+    
+    cursor.execute(f'SELECT COUNT(*) as count FROM "{SCHEMA}"."products" WHERE status <> %s', ('deleted',))
+    products_count = cursor.fetchone()['count']
+    
+    cursor.execute(f'SELECT COUNT(*) as count FROM "{SCHEMA}"."customers"')
+    customers_count = cursor.fetchone()['count']
+    
+    cursor.execute(f'''
+        SELECT date, revenue, orders_count, new_customers
+        FROM "{SCHEMA}"."sales_analytics"
+        ORDER BY date DESC
+        LIMIT 7
+    ''')
+    analytics_data = cursor.fetchall()
+    
+    chart_data = []
+    for row in reversed(list(analytics_data)):
+        chart_data.append({
+            'date': row['date'].strftime('%d.%m'),
+            'revenue': float(row['revenue']),
+            'orders': row['orders_count'],
+            'customers': row['new_customers']
+        })
+    
+    return json_response({
+        'stats': {
+            'revenue': float(stats['total_revenue']) if stats['total_revenue'] else 0,
+            'orders': stats['total_orders'],
+            'products': products_count,
+            'customers': customers_count
+        },
+        'chartData': chart_data
+    })
+
+
+def authenticate(req: Request) -> None:
+    req.user_id = get_request_user_id(req.event)
+
+
+def internal_error(req: Request, error: Exception) -> Dict[str, Any]:
+    return json_response({
+        'error': str(error),
+        'type': type(error).__name__,
+        'traceback': traceback.format_exc()
+    }, 500)
+
+
+router = Router('path', autocommit=False, cors_methods='GET, POST, PUT, DELETE, OPTIONS',
+                not_found=lambda req: json_response({'error': 'Endpoint not found'}, 404),
+                before=authenticate, errors={AuthError: 401}, on_error=internal_error)
+
+# Таблица маршрутов: (path, метод) -> обработчик
+ROUTES = {
+    ('auth/login', 'POST'): auth_login_post,
+    ('products', 'GET'): products_get,
+    ('products', 'POST'): products_post,
+    ('products', 'PUT'): products_put,
+    ('products', 'DELETE'): products_delete,
+    ('products/bulk', 'POST'): products_bulk_post,
+    ('products/import', 'POST'): products_import_post,
+    ('export', 'GET'): export_get,
+    ('customers/recompute', 'POST'): customers_recompute_post,
+    ('products/purge', 'POST'): products_purge_post,
+    ('orders/partitions', 'POST'): orders_partitions_post,
+    ('changes', 'GET'): changes_get,
+    ('changes/prune', 'POST'): changes_prune_post,
+    ('orders/stream', 'GET'): orders_stream_get,
+    ('orders', 'GET'): orders_get,
+    ('customers', 'GET'): customers_get,
+    ('marketplaces', 'GET'): marketplaces_get,
+    ('marketplaces/connect', 'POST'): marketplaces_connect_post,
+    ('marketplaces/disconnect', 'POST'): marketplaces_disconnect_post,
+    ('analytics', 'GET'): analytics_get,
+}
+for (path, method), route_handler in ROUTES.items():
+    router.add(path, route_handler, (method,))
+
+
+@compressed
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
@@ -1,146 +1,220 @@
 import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Mapping, Optional, Tuple
 from datetime import datetime, timedelta
+import base64
 import hashlib
+import hmac
 import secrets
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+from collections import OrderedDict
+from threading import Lock
+from types import MappingProxyType
+from access_token import PERMISSIONS, PERMISSION_BITS, ConfigError, check_secret, issue_token, names_to_mask
+from runtime import ANY_METHOD, Request, Router, db_cursor, error_response, lazy_module, success_response
+from rate_limit import SlidingWindowLimiter, rejected_by_reason
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: Система авторизации и управления ролями пользователей
-    Args: event - dict with httpMethod, body, queryStringParameters
-          context - object with request_id, function_name
-    Returns: HTTP response dict с токенами и данными пользователя
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return cors_response()
-    
-    query_params = event.get('queryStringParameters', {}) or {}
-    action = query_params.get('action', '')
-    headers = event.get('headers', {})
-    
-    try:
-        if action == 'register' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return register_user(body_data)
-        
-        elif action == 'login' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return login_user(body_data)
-        
-        elif action == 'getUser':
-            auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-            return get_user(auth_token)
-        
-        elif action == 'updateRole' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-            return update_user_role(body_data, auth_token)
-        
-        elif action == 'getUsers':
-            auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-            return get_all_users(auth_token)
-        
-        elif action == 'checkPermission':
-            auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
-            permission = query_params.get('permission')
-            return check_permission(auth_token, permission)
-        
-        else:
-            return error_response('Invalid action', 400)
-    
-    except Exception as e:
-        return error_response(str(e), 500)
-
-
-def get_db_connection():
-    """Получение подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(database_url)
-    conn.set_session(autocommit=True)
-    return conn
-
-
-def hash_password(password: str) -> str:
-    """Хеширование пароля"""
+bcrypt = lazy_module('bcrypt')
+
+MIN_HASH_ROUNDS = 10
+MAX_HASH_ROUNDS = 14
+HASH_TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', '250'))
+
+_hash_rounds: Optional[int] = None
+
+LOGIN_WINDOW_SECONDS = int(os.environ.get('LOGIN_WINDOW_SECONDS', '300'))
+email_login_limiter = SlidingWindowLimiter(int(os.environ.get('LOGIN_MAX_PER_EMAIL', '5')), LOGIN_WINDOW_SECONDS)
+ip_login_limiter = SlidingWindowLimiter(int(os.environ.get('LOGIN_MAX_PER_IP', '30')), LOGIN_WINDOW_SECONDS)
+
+SESSION_TTL_HOURS = int(os.environ.get('SESSION_TTL_HOURS', '168'))
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '1024'))
+SESSION_CACHE_TTL = 60
+
+_session_cache: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+_session_cache_lock = Lock()
+
+ROLE_GRANTS = {
+    'owner': PERMISSIONS,
+    'admin': PERMISSIONS,
+    'manager': ['view_dashboard', 'manage_products', 'manage_orders', 'view_analytics',
+                'manage_marketplaces', 'view_ml_predictions'],
+    'analyst': ['view_dashboard', 'view_analytics', 'view_ml_predictions'],
+    'operator': ['view_dashboard', 'manage_products', 'manage_orders'],
+    'support': ['view_dashboard', 'manage_orders']
+}
+
+# Роли компилируются один раз при импорте в неизменяемые битовые маски
+ROLE_MASKS: Mapping[str, int] = MappingProxyType({
+    role: names_to_mask(granted) for role, granted in ROLE_GRANTS.items()
+})
+ROLE_PERMISSIONS: Mapping[str, Mapping[str, bool]] = MappingProxyType({
+    role: MappingProxyType({name: bool(mask & bit) for name, bit in PERMISSION_BITS.items()})
+    for role, mask in ROLE_MASKS.items()
+})
+
+def tune_hash_rounds(target_ms: float = HASH_TARGET_MS) -> int:
+    """Подбор стоимости bcrypt под целевое время хеширования"""
+    rounds = MIN_HASH_ROUNDS
+    started = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(rounds))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    # Каждый дополнительный раунд удваивает стоимость
+    while rounds < MAX_HASH_ROUNDS and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+
+    return rounds
+
+
+def get_hash_rounds() -> int:
+    """Стоимость bcrypt: из PASSWORD_HASH_ROUNDS или подобранная один раз на контейнер"""
+    global _hash_rounds
+    if _hash_rounds is None:
+        configured = os.environ.get('PASSWORD_HASH_ROUNDS')
+        _hash_rounds = int(configured) if configured else tune_hash_rounds()
+    return _hash_rounds
+
+
+def check_config() -> None:
+    """Проверка окружения на холодном старте: ошибка конфигурации видна в логе сразу, а не 500 после записи пользователя"""
+    check_secret()
+    configured = os.environ.get('PASSWORD_HASH_ROUNDS')
+    if configured and not (configured.isdigit() and MIN_HASH_ROUNDS <= int(configured) <= MAX_HASH_ROUNDS):
+        raise ConfigError(f'PASSWORD_HASH_ROUNDS must be an integer from {MIN_HASH_ROUNDS} to {MAX_HASH_ROUNDS}')
+
+
+check_config()
+
+
+def legacy_hash_password(password: str) -> str:
+    """Старый формат хеша (SHA-256 без соли), нужен только для миграции"""
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+def _bcrypt_hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _bcrypt_check(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+    except ValueError:
+        return False
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """Хеширование пароля bcrypt; bcrypt отпускает GIL, параллельные вызовы не ждут друг друга"""
+    return _bcrypt_hash(password, rounds or get_hash_rounds())
+
+
+def verify_password(password: str, password_hash: str) -> Tuple[bool, bool]:
+    """Проверка пароля, возвращает (совпадает, нужно перехешировать)"""
+    if not password_hash:
+        return False, False
+
+    if not password_hash.startswith('$2'):
+        matches = hmac.compare_digest(legacy_hash_password(password), password_hash)
+        return matches, matches
+
+    matches = _bcrypt_check(password, password_hash)
+    if not matches:
+        return False, False
+
+    try:
+        stored_rounds = int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        stored_rounds = 0
+    # Только повышение стоимости: контейнеры, подобравшие разные раунды, не перехешируют пароль туда-обратно
+    return True, stored_rounds < get_hash_rounds()
+
+
 def generate_token() -> str:
     """Генерация случайного токена"""
     return secrets.token_urlsafe(32)
 
 
+def hash_token(token: str) -> str:
+    """Хеш токена для хранения в user_sessions"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(cur, user_id: int, role: str) -> str:
+    """Создание сессии, возвращает токен для клиента"""
+    token = generate_token()
+    cur.execute("""
+        INSERT INTO user_sessions (token_hash, user_id, role, expires_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))
+    """, (hash_token(token), user_id, role, SESSION_TTL_HOURS))
+    return token
+
+
+def _cache_session(token_hash: str, user: Dict[str, Any], expires_at: datetime) -> None:
+    # Запись в кэше живет не дольше SESSION_CACHE_TTL, чтобы отзыв сессии
+    # в другом контейнере доходил сюда за разумное время
+    cache_expires = time.time() + SESSION_CACHE_TTL
+    cache_expires = min(cache_expires, expires_at.timestamp())
+    with _session_cache_lock:
+        _session_cache[token_hash] = (cache_expires, user)
+        _session_cache.move_to_end(token_hash)
+        while len(_session_cache) > SESSION_CACHE_SIZE:
+            _session_cache.popitem(last=False)
+
+
+def invalidate_sessions(user_id: Optional[int] = None, token_hash: Optional[str] = None) -> None:
+    """Сброс кэша сессий по токену или по пользователю"""
+    with _session_cache_lock:
+        if token_hash is not None:
+            _session_cache.pop(token_hash, None)
+        if user_id is not None:
+            for key in [k for k, (_, u) in _session_cache.items() if u['id'] == user_id]:
+                del _session_cache[key]
+
+
+def resolve_session(auth_token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Пользователь по токену: сначала LRU-кэш, затем user_sessions"""
+    if not auth_token:
+        return None
+
+    token_hash = hash_token(auth_token)
+    with _session_cache_lock:
+        cached = _session_cache.get(token_hash)
+        if cached is not None:
+            if cached[0] > time.time():
+                _session_cache.move_to_end(token_hash)
+                return cached[1]
+            del _session_cache[token_hash]
+
+    cur = db_cursor()
+
+    cur.execute("""
+        SELECT u.id, u.email, u.full_name, s.role, u.is_active, u.created_at, s.expires_at
+        FROM user_sessions s
+        JOIN users u ON u.id = s.user_id
+        WHERE s.token_hash = %s AND s.expires_at > CURRENT_TIMESTAMP AND u.is_active = true
+    """, (token_hash,))
+    row = cur.fetchone()
+
+    if not row:
+        return None
+
+    user = dict(row)
+    expires_at = user.pop('expires_at')
+    _cache_session(token_hash, user, expires_at)
+    return user
+
+
+def get_role_mask(role: str) -> int:
+    """Битовая маска прав роли, неизвестная роль получает права operator"""
+    return ROLE_MASKS.get(role, ROLE_MASKS['operator'])
+
+
 def get_role_permissions(role: str) -> Dict[str, bool]:
     """Получение прав доступа для роли"""
-    permissions = {
-        'owner': {
-            'view_dashboard': True,
-            'manage_products': True,
-            'manage_orders': True,
-            'view_analytics': True,
-            'manage_users': True,
-            'manage_marketplaces': True,
-            'view_ml_predictions': True,
-            'manage_settings': True
-        },
-        'manager': {
-            'view_dashboard': True,
-            'manage_products': True,
-            'manage_orders': True,
-            'view_analytics': True,
-            'manage_users': False,
-            'manage_marketplaces': True,
-            'view_ml_predictions': True,
-            'manage_settings': False
-        },
-        'analyst': {
-            'view_dashboard': True,
-            'manage_products': False,
-            'manage_orders': False,
-            'view_analytics': True,
-            'manage_users': False,
-            'manage_marketplaces': False,
-            'view_ml_predictions': True,
-            'manage_settings': False
-        },
-        'operator': {
-            'view_dashboard': True,
-            'manage_products': True,
-            'manage_orders': True,
-            'view_analytics': False,
-            'manage_users': False,
-            'manage_marketplaces': False,
-            'view_ml_predictions': False,
-            'manage_settings': False
-        },
-        'support': {
-            'view_dashboard': True,
-            'manage_products': False,
-            'manage_orders': True,
-            'view_analytics': False,
-            'manage_users': False,
-            'manage_marketplaces': False,
-            'view_ml_predictions': False,
-            'manage_settings': False
-        },
-        'admin': {
-            'view_dashboard': True,
-            'manage_products': True,
-            'manage_orders': True,
-            'view_analytics': True,
-            'manage_users': True,
-            'manage_marketplaces': True,
-            'view_ml_predictions': True,
-            'manage_settings': True
-        }
-    }
-    
-    return permissions.get(role, permissions['operator'])
+    return dict(ROLE_PERMISSIONS.get(role, ROLE_PERMISSIONS['operator']))
+
+
+SELF_REGISTER_ROLE = 'operator'
 
 
 def register_user(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -148,13 +222,13 @@ def register_user(data: Dict[str, Any]) -> Dict[str, Any]:
     email = data.get('email')
     password = data.get('password')
     full_name = data.get('fullName')
-    role = data.get('role', 'operator')
+    # Роль из тела запроса игнорируется: повысить ее может только updateRole с правом manage_users
+    role = SELF_REGISTER_ROLE
     
     if not email or not password:
         return error_response('Email and password are required', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute("""
         SELECT id FROM users
@@ -162,8 +236,6 @@ def register_user(data: Dict[str, Any]) -> Dict[str, Any]:
     """, (email,))
     
     if cur.fetchone():
-        cur.close()
-        conn.close()
         return error_response('User already exists', 400)
     
     password_hash = hash_password(password)
@@ -176,21 +248,43 @@ def register_user(data: Dict[str, Any]) -> Dict[str, Any]:
     """, (email, password_hash, full_name, role))
     
     user = cur.fetchone()
-    cur.close()
-    conn.close()
+    token = create_session(cur, user['id'], user['role'])
     
-    token = generate_token()
     permissions = get_role_permissions(role)
     
     return success_response({
         'user': dict(user),
         'token': token,
+        'accessToken': issue_token(user['id'], user['role'], get_role_mask(user['role'])),
         'permissions': permissions,
         'message': 'Пользователь создан успешно'
     })
 
 
-def login_user(data: Dict[str, Any]) -> Dict[str, Any]:
+def get_client_ip(event: Dict[str, Any]) -> str:
+    """IP клиента из контекста запроса или X-Forwarded-For"""
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = event.get('headers', {}) or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for') or ''
+    return forwarded.split(',')[0].strip() or 'unknown'
+
+
+def throttle_login(email: str, client_ip: str) -> Optional[Dict[str, Any]]:
+    """Проверка лимитов попыток входа, возвращает ответ 429 при превышении"""
+    for reason, limiter, key in (('ip', ip_login_limiter, client_ip),
+                                 ('email', email_login_limiter, email.lower())):
+        allowed, retry_after = limiter.hit(key)
+        if not allowed:
+            rejected_by_reason[reason] += 1
+            response = error_response('Too many login attempts, try again later', 429)
+            response['headers']['Retry-After'] = str(retry_after)
+            return response
+    return None
+
+
+def login_user(data: Dict[str, Any], client_ip: str = 'unknown') -> Dict[str, Any]:
     """Вход пользователя"""
     email = data.get('email')
     password = data.get('password')
@@ -198,33 +292,48 @@ def login_user(data: Dict[str, Any]) -> Dict[str, Any]:
     if not email or not password:
         return error_response('Email and password are required', 400)
     
-    password_hash = hash_password(password)
+    throttled = throttle_login(email, client_ip)
+    if throttled:
+        return throttled
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute("""
-        SELECT id, email, full_name, role, is_active
+        SELECT id, email, full_name, role, is_active, password_hash
         FROM users
-        WHERE email = %s AND password_hash = %s
-    """, (email, password_hash))
+        WHERE email = %s
+    """, (email,))
     
     user = cur.fetchone()
-    cur.close()
-    conn.close()
+    matches, needs_rehash = verify_password(password, user['password_hash']) if user else (False, False)
     
-    if not user:
+    if matches and needs_rehash:
+        cur.execute("""
+            UPDATE users
+            SET password_hash = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (hash_password(password), user['id']))
+    
+    token = None
+    if matches and user['is_active']:
+        token = create_session(cur, user['id'], user['role'])
+    
+    if not matches:
         return error_response('Invalid credentials', 401)
     
+    user = dict(user)
+    del user['password_hash']
+    
     if not user['is_active']:
         return error_response('User is inactive', 403)
     
-    token = generate_token()
+    email_login_limiter.reset(email.lower())
     permissions = get_role_permissions(user['role'])
     
     return success_response({
         'user': dict(user),
         'token': token,
+        'accessToken': issue_token(user['id'], user['role'], get_role_mask(user['role'])),
         'permissions': permissions,
         'message': 'Вход выполнен успешно'
     })
@@ -235,27 +344,16 @@ def get_user(auth_token: Optional[str]) -> Dict[str, Any]:
     if not auth_token:
         return error_response('Authorization required', 401)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute("""
-        SELECT id, email, full_name, role, is_active, created_at
-        FROM users
-        WHERE is_active = true
-        LIMIT 1
-    """)
-    
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    user = resolve_session(auth_token)
     
     if not user:
-        return error_response('User not found', 404)
+        return error_response('Invalid or expired token', 401)
     
     permissions = get_role_permissions(user['role'])
     
     return success_response({
-        'user': dict(user),
+        'user': user,
+        'accessToken': issue_token(user['id'], user['role'], get_role_mask(user['role'])),
         'permissions': permissions
     })
 
@@ -271,12 +369,17 @@ def update_user_role(data: Dict[str, Any], auth_token: Optional[str]) -> Dict[st
     if not user_id or not new_role:
         return error_response('User ID and role are required', 400)
     
-    valid_roles = ['owner', 'manager', 'analyst', 'operator', 'support', 'admin']
-    if new_role not in valid_roles:
+    if new_role not in ROLE_MASKS:
         return error_response('Invalid role', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    current_user = resolve_session(auth_token)
+    if not current_user:
+        return error_response('Invalid or expired token', 401)
+    
+    if not get_role_mask(current_user['role']) & PERMISSION_BITS['manage_users']:
+        return error_response('Permission denied', 403)
+    
+    cur = db_cursor()
     
     cur.execute("""
         UPDATE users
@@ -286,39 +389,163 @@ def update_user_role(data: Dict[str, Any], auth_token: Optional[str]) -> Dict[st
     """, (new_role, user_id))
     
     user = cur.fetchone()
-    cur.close()
-    conn.close()
+    
+    if user:
+        cur.execute("""
+            UPDATE user_sessions SET role = %s
+            WHERE user_id = %s
+        """, (new_role, user['id']))
     
     if not user:
         return error_response('User not found', 404)
     
+    invalidate_sessions(user_id=user['id'])
+    
     return success_response({
         'user': dict(user),
         'message': 'Роль обновлена успешно'
     })
 
 
-def get_all_users(auth_token: Optional[str]) -> Dict[str, Any]:
-    """Получение списка всех пользователей"""
+def logout_user(auth_token: Optional[str]) -> Dict[str, Any]:
+    """Завершение сессии"""
     if not auth_token:
         return error_response('Authorization required', 401)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    token_hash = hash_token(auth_token)
+    
+    cur = db_cursor()
     
     cur.execute("""
+        DELETE FROM user_sessions
+        WHERE token_hash = %s
+    """, (token_hash,))
+    
+    invalidate_sessions(token_hash=token_hash)
+    
+    return success_response({'message': 'Сессия завершена'})
+
+
+def get_login_throttle_stats(auth_token: Optional[str]) -> Dict[str, Any]:
+    """Счетчики отклоненных попыток входа в этом контейнере"""
+    user = resolve_session(auth_token)
+    
+    if not user:
+        return error_response('Invalid or expired token', 401)
+    
+    if not get_role_mask(user['role']) & PERMISSION_BITS['manage_users']:
+        return error_response('Permission denied', 403)
+    
+    return success_response({
+        'rejected': dict(rejected_by_reason),
+        'rejectedTotal': email_login_limiter.rejected + ip_login_limiter.rejected,
+        'windowSeconds': LOGIN_WINDOW_SECONDS
+    })
+
+
+USERS_PAGE_SIZE = 50
+USERS_MAX_PAGE_SIZE = 200
+
+
+def encode_users_cursor(created_at: datetime, user_id: int) -> str:
+    """Курсор keyset-пагинации по (created_at, id)"""
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), user_id]).encode()).decode()
+
+
+def decode_users_cursor(cursor: str) -> Tuple[datetime, int]:
+    created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(created_at), int(user_id)
+
+
+def estimate_users_count(cur, where_sql: str, params: List[Any]) -> int:
+    """Оценка числа строк без полного подсчета: reltuples или оценка планировщика"""
+    if not params:
+        cur.execute("""
+            SELECT GREATEST(reltuples, 0)::bigint as estimate
+            FROM pg_class
+            WHERE oid = 'users'::regclass
+        """)
+        return cur.fetchone()['estimate']
+
+    cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM users WHERE {where_sql}", params)
+    plan = cur.fetchone()['QUERY PLAN']
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_all_users(auth_token: Optional[str], query_params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Получение списка пользователей постранично (только с правом manage_users)"""
+    if not auth_token:
+        return error_response('Authorization required', 401)
+    
+    current_user = resolve_session(auth_token)
+    if not current_user:
+        return error_response('Invalid or expired token', 401)
+    
+    if not get_role_mask(current_user['role']) & PERMISSION_BITS['manage_users']:
+        return error_response('Permission denied', 403)
+    
+    query_params = query_params or {}
+    
+    try:
+        limit = min(int(query_params.get('limit', USERS_PAGE_SIZE)), USERS_MAX_PAGE_SIZE)
+        cursor = decode_users_cursor(query_params['cursor']) if query_params.get('cursor') else None
+    except ValueError:
+        return error_response('Invalid limit or cursor', 400)
+    
+    if limit <= 0:
+        return error_response('Invalid limit or cursor', 400)
+    
+    where_clauses = []
+    params: List[Any] = []
+    
+    role = query_params.get('role')
+    if role:
+        where_clauses.append('role = %s')
+        params.append(role)
+    
+    is_active = query_params.get('isActive')
+    if is_active in ('true', 'false'):
+        where_clauses.append('is_active = %s')
+        params.append(is_active == 'true')
+    
+    search = query_params.get('search')
+    if search:
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        where_clauses.append('email LIKE %s')
+        params.append(escaped + '%')
+    
+    filter_sql = ' AND '.join(where_clauses) if where_clauses else 'true'
+    page_sql = filter_sql
+    page_params = list(params)
+    
+    if cursor:
+        page_sql += ' AND (created_at, id) < (%s, %s)'
+        page_params.extend(cursor)
+    
+    cur = db_cursor()
+    
+    cur.execute(f"""
         SELECT id, email, full_name, role, is_active, created_at
         FROM users
-        ORDER BY created_at DESC
-    """)
-    
+        WHERE {page_sql}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, page_params + [limit + 1])
     users = cur.fetchall()
-    cur.close()
-    conn.close()
+    total = estimate_users_count(cur, filter_sql, params)
+    
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_users_cursor(users[-1]['created_at'], users[-1]['id'])
     
     return success_response({
         'users': [dict(u) for u in users],
-        'total': len(users)
+        'nextCursor': next_cursor,
+        'total': total,
+        'totalIsEstimate': True
     })
 
 
@@ -327,24 +554,12 @@ def check_permission(auth_token: Optional[str], permission: str) -> Dict[str, An
     if not auth_token:
         return error_response('Authorization required', 401)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute("""
-        SELECT role FROM users
-        WHERE is_active = true
-        LIMIT 1
-    """)
-    
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
+    result = resolve_session(auth_token)
     
     if not result:
-        return error_response('User not found', 404)
+        return error_response('Invalid or expired token', 401)
     
-    permissions = get_role_permissions(result['role'])
-    has_permission = permissions.get(permission, False)
+    has_permission = bool(get_role_mask(result['role']) & PERMISSION_BITS.get(permission, 0))
     
     return success_response({
         'permission': permission,
@@ -353,42 +568,60 @@ def check_permission(auth_token: Optional[str], permission: str) -> Dict[str, An
     })
 
 
-def cors_response() -> Dict[str, Any]:
-    """CORS preflight response"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
-            'Access-Control-Max-Age': '86400'
-        },
-        'body': '',
-        'isBase64Encoded': False
-    }
-
-
-def success_response(data: Any) -> Dict[str, Any]:
-    """Успешный ответ"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps(data, default=str)
-    }
-
-
-def error_response(message: str, status_code: int = 400) -> Dict[str, Any]:
-    """Ответ с ошибкой"""
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps({'error': message})
-    }
\ No newline at end of file
+def check_permissions(auth_token: Optional[str], permissions: List[str]) -> Dict[str, Any]:
+    """Проверка списка прав одним запросом"""
+    if not auth_token:
+        return error_response('Authorization required', 401)
+    
+    if not permissions:
+        return error_response('Permissions list is required', 400)
+    
+    user = resolve_session(auth_token)
+    
+    if not user:
+        return error_response('Invalid or expired token', 401)
+    
+    mask = get_role_mask(user['role'])
+    
+    return success_response({
+        'permissions': {p: bool(mask & PERMISSION_BITS.get(p, 0)) for p in permissions},
+        'role': user['role']
+    })
+
+
+def auth_token_of(req: Request) -> Optional[str]:
+    return req.header('X-Auth-Token')
+
+
+def requested_permissions(req: Request) -> List[str]:
+    if req.method == 'POST':
+        return req.json().get('permissions', [])
+    return [p for p in req.query.get('permissions', '').split(',') if p]
+
+
+router = Router('action', cors_headers='Content-Type, X-Auth-Token')
+
+# Таблица маршрутов: action -> (методы, обработчик)
+ROUTES = {
+    'register': (('POST',), lambda req: register_user(req.json())),
+    'login': (('POST',), lambda req: login_user(req.json(), get_client_ip(req.event))),
+    'getLoginThrottleStats': ((ANY_METHOD,), lambda req: get_login_throttle_stats(auth_token_of(req))),
+    'logout': (('POST',), lambda req: logout_user(auth_token_of(req))),
+    'getUser': ((ANY_METHOD,), lambda req: get_user(auth_token_of(req))),
+    'updateRole': (('POST',), lambda req: update_user_role(req.json(), auth_token_of(req))),
+    'getUsers': ((ANY_METHOD,), lambda req: get_all_users(auth_token_of(req), req.query)),
+    'checkPermissions': ((ANY_METHOD,), lambda req: check_permissions(auth_token_of(req), requested_permissions(req))),
+    'checkPermission': ((ANY_METHOD,), lambda req: check_permission(auth_token_of(req), req.query.get('permission'))),
+}
+for action, (methods, route_handler) in ROUTES.items():
+    router.add(action, route_handler, methods)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Система авторизации и управления ролями пользователей
+    Args: event - dict with httpMethod, body, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response dict с токенами и данными пользователя
+    '''
+    return router.dispatch(event, context)
@@ -0,0 +1,75 @@
+'''
+Business: Ограничение частоты попыток входа скользящим окном до обращения к БД
+Args: ключ (email или IP), лимит попыток и длина окна в секундах
+Returns: SlidingWindowLimiter.hit - разрешена ли попытка и через сколько секунд повторить
+'''
+
+import time
+from collections import Counter
+from threading import Lock
+from typing import Dict, List, Tuple
+
+
+class InMemoryWindowStore:
+    """Счетчики окон в памяти контейнера: ключ -> [начало окна, текущее, предыдущее]"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._windows: Dict[str, List[float]] = {}
+        self._lock = Lock()
+
+    def increment(self, key: str, window: int, now: float) -> Tuple[int, int, float]:
+        """Увеличить счетчик текущего окна, вернуть (текущее, предыдущее, начало окна)"""
+        window_start = now - now % window
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None:
+                if len(self._windows) >= self.max_keys:
+                    self._evict(now, window)
+                entry = self._windows[key] = [window_start, 0, 0]
+            elif entry[0] != window_start:
+                # Предыдущее окно учитывается только если оно непосредственно перед текущим
+                entry[2] = entry[1] if entry[0] == window_start - window else 0
+                entry[1] = 0
+                entry[0] = window_start
+            entry[1] += 1
+            return int(entry[1]), int(entry[2]), window_start
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def _evict(self, now: float, window: int) -> None:
+        stale_before = now - 2 * window
+        for key in [k for k, entry in self._windows.items() if entry[0] < stale_before]:
+            del self._windows[key]
+        if len(self._windows) >= self.max_keys:
+            self._windows.clear()
+
+
+class SlidingWindowLimiter:
+    """Приближенное скользящее окно: взвешенная сумма текущего и предыдущего окна.
+    Хранилище можно заменить общим (например, Redis) с тем же методом increment/reset."""
+
+    def __init__(self, limit: int, window: int, store=None):
+        self.limit = limit
+        self.window = window
+        self.store = store or InMemoryWindowStore()
+        self.rejected = 0
+
+    def hit(self, key: str) -> Tuple[bool, int]:
+        now = time.time()
+        current, previous, window_start = self.store.increment(key, self.window, now)
+        elapsed = (now - window_start) / self.window
+        estimate = previous * (1 - elapsed) + current
+
+        if estimate > self.limit:
+            self.rejected += 1
+            return False, max(1, int(window_start + self.window - now))
+        return True, 0
+
+    def reset(self, key: str) -> None:
+        self.store.reset(key)
+
+
+rejected_by_reason: Counter = Counter()
@@ -0,0 +1,134 @@
+'''
+Business: Подписанные токены доступа (JWT HS256) с ролью и битовой маской прав
+Args: AUTH_TOKEN_SECRET - общий секрет функций, AUTH_REQUIRED - отклонять запросы без токена
+Returns: issue_token выдает токен в auth, остальные функции проверяют его локально
+Файл одинаковый во всех функциях (auth, api, crm-api, ml-predictions) - меняйте копии вместе
+'''
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+
+PERMISSIONS: List[str] = [
+    'view_dashboard',
+    'manage_products',
+    'manage_orders',
+    'view_analytics',
+    'manage_users',
+    'manage_marketplaces',
+    'view_ml_predictions',
+    'manage_settings'
+]
+PERMISSION_BITS: Mapping[str, int] = MappingProxyType({name: 1 << bit for bit, name in enumerate(PERMISSIONS)})
+
+ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL', '900'))
+DEFAULT_USER_ID = 1
+
+_HEADER = {'alg': 'HS256', 'typ': 'JWT'}
+
+
+class AuthError(Exception):
+    """Токен отсутствует, поврежден или просрочен"""
+
+
+class ConfigError(Exception):
+    """Функция развернута без обязательной переменной окружения или с неверным значением"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _secret() -> bytes:
+    secret = os.environ.get('AUTH_TOKEN_SECRET')
+    if not secret:
+        raise ConfigError('AUTH_TOKEN_SECRET is not set: add the shared token secret to the function secrets')
+    return secret.encode()
+
+
+def check_secret() -> None:
+    """Проверка на холодном старте для функции, которая выпускает токены"""
+    _secret()
+
+
+def _sign(signing_input: str) -> str:
+    return _b64encode(hmac.new(_secret(), signing_input.encode(), hashlib.sha256).digest())
+
+
+def permissions_to_mask(permissions: Dict[str, bool]) -> int:
+    """Словарь прав -> битовая маска в порядке PERMISSIONS"""
+    return names_to_mask(name for name, granted in permissions.items() if granted)
+
+
+def names_to_mask(names: Iterable[str]) -> int:
+    """Список прав -> битовая маска, неизвестные права игнорируются"""
+    mask = 0
+    for name in names:
+        mask |= PERMISSION_BITS.get(name, 0)
+    return mask
+
+
+def issue_token(user_id: int, role: str, permissions_mask: int, ttl: int = ACCESS_TOKEN_TTL) -> str:
+    """Выпуск подписанного токена доступа"""
+    now = int(time.time())
+    payload = {'sub': user_id, 'role': role, 'perm': permissions_mask, 'iat': now, 'exp': now + ttl}
+    signing_input = '.'.join([
+        _b64encode(json.dumps(_HEADER, separators=(',', ':')).encode()),
+        _b64encode(json.dumps(payload, separators=(',', ':')).encode())
+    ])
+    return f'{signing_input}.{_sign(signing_input)}'
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    """Проверка подписи и срока действия, возвращает claims"""
+    parts = token.split('.')
+    if len(parts) != 3:
+        raise AuthError('Malformed token')
+
+    signing_input = f'{parts[0]}.{parts[1]}'
+    if not hmac.compare_digest(_sign(signing_input), parts[2]):
+        raise AuthError('Invalid token signature')
+
+    try:
+        claims = json.loads(_b64decode(parts[1]))
+    except ValueError:
+        raise AuthError('Malformed token')
+
+    if claims.get('exp', 0) <= time.time():
+        raise AuthError('Token expired')
+
+    return claims
+
+
+def has_permission(claims: Dict[str, Any], permission: str) -> bool:
+    """Проверка права по битовой маске из токена"""
+    bit = PERMISSION_BITS.get(permission, 0)
+    return bit != 0 and bool(claims.get('perm', 0) & bit)
+
+
+def get_request_claims(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Claims из заголовка X-Auth-Token, None если токен не передан"""
+    headers = event.get('headers', {}) or {}
+    token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+
+    if not token:
+        if os.environ.get('AUTH_REQUIRED') == 'true':
+            raise AuthError('Authorization required')
+        return None
+
+    return verify_token(token)
+
+
+def get_request_user_id(event: Dict[str, Any]) -> int:
+    """ID пользователя из токена; без токена - пользователь по умолчанию, пока не включен AUTH_REQUIRED"""
+    claims = get_request_claims(event)
+    return int(claims['sub']) if claims else DEFAULT_USER_ID
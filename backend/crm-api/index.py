@@ -1,100 +1,16 @@
-import json
 import os
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import requests
+from access_token import AuthError, get_request_user_id
+from runtime import (ANY_METHOD, Request, Router, db_cursor, error_response, lazy_module,
+                     success_response)
+from serialization import compressed, fetch_records
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: Центральное API для CRM системы с реальной интеграцией Ozon Seller API
-    Args: event - dict with httpMethod, body, queryStringParameters
-          context - object with request_id, function_name
-    Returns: HTTP response dict с данными CRM системы
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return cors_response()
-    
-    query_params = event.get('queryStringParameters', {}) or {}
-    action = query_params.get('action', '')
-    
-    try:
-        if action == 'getMarketplaces':
-            return get_marketplaces()
-        elif action == 'connectMarketplace' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return connect_marketplace(body_data)
-        elif action == 'disconnectMarketplace' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return disconnect_marketplace(body_data)
-        elif action == 'syncMarketplace' and method == 'POST':
-            marketplace_id = query_params.get('marketplaceId')
-            return sync_marketplace_data(marketplace_id)
-        elif action == 'getMarketplaceData':
-            marketplace_id = query_params.get('marketplaceId')
-            return get_marketplace_specific_data(marketplace_id)
-        elif action == 'getProducts':
-            marketplace = query_params.get('marketplace')
-            return get_products(marketplace)
-        elif action == 'updateProduct' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return update_product(body_data)
-        elif action == 'getOrders':
-            status = query_params.get('status')
-            marketplace = query_params.get('marketplace')
-            return get_orders(status, marketplace)
-        elif action == 'updateOrderStatus' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return update_order_status(body_data)
-        elif action == 'shipOrder' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return ship_order(body_data)
-        elif action == 'getAnalytics':
-            period = query_params.get('period', '30d')
-            return get_analytics(period)
-        elif action == 'getDashboard':
-            return get_dashboard()
-        elif action == 'ozonUpdatePrice' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return ozon_update_price(body_data)
-        elif action == 'ozonUpdateStock' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return ozon_update_stock(body_data)
-        elif action == 'ozonGetFinance':
-            marketplace_id = query_params.get('marketplaceId')
-            return ozon_get_finance_data(marketplace_id)
-        elif action == 'ozonPackOrder' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return ozon_pack_order(body_data)
-        elif action == 'ozonShipOrder' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return ozon_ship_order(body_data)
-        elif action == 'ozonGetReturns':
-            marketplace_id = query_params.get('marketplaceId')
-            return ozon_get_returns(marketplace_id)
-        elif action == 'ozonAcceptReturn' and method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            return ozon_accept_return(body_data)
-        else:
-            return error_response('Invalid action', 400)
-    except Exception as e:
-        import traceback
-        return error_response(f'{str(e)}\n\n{traceback.format_exc()}', 500)
-
-
-def get_db_connection():
-    """Получение подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        raise ValueError('DATABASE_URL not set')
-    
-    conn = psycopg2.connect(database_url)
-    conn.set_session(autocommit=True)
-    return conn
+requests = lazy_module('requests')
 
+# Колонки товара для ответов: служебный search_vector и прочие внутренние колонки не отдаются
+PRODUCT_COLUMNS = ('p.id, p.name, p.description, p.price, p.cost_price, p.sku, p.category, p.stock, p.image_url, '
+                   'p.status, p.deleted_at, p.created_at, p.updated_at')
 
 def call_ozon_api(endpoint: str, method: str = 'POST', data: Dict = None, client_id: str = None, api_key: str = None) -> Dict:
     """Вызов Ozon Seller API"""
@@ -138,7 +54,7 @@ def call_ozon_api(endpoint: str, method: str = 'POST', data: Dict = None, client
         raise ValueError(f'Ozon API connection failed: {str(e)}')
 
 
-def sync_marketplace_data(marketplace_id: Optional[str] = None) -> Dict[str, Any]:
+def sync_marketplace_data(marketplace_id: Optional[str] = None, user_id: int = 1) -> Dict[str, Any]:
     """Синхронизация данных с реальным API маркетплейса"""
     if not marketplace_id:
         return error_response('Marketplace ID required', 400)
@@ -148,22 +64,19 @@ def sync_marketplace_data(marketplace_id: Optional[str] = None) -> Dict[str, Any
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT m.id, m.name, m.slug, umi.api_key, umi.store_id, umi.api_secret
         FROM t_p86529894_ecommerce_management.marketplaces m
         JOIN t_p86529894_ecommerce_management.user_marketplace_integrations umi ON m.id = umi.marketplace_id
-        WHERE m.id = {mp_id} AND umi.user_id = 1
+        WHERE m.id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     mp = cur.fetchone()
     
     if not mp:
-        cur.close()
-        conn.close()
         return error_response(f'Marketplace not connected', 404)
     
     marketplace_slug = mp['slug'].lower()
@@ -181,12 +94,9 @@ def sync_marketplace_data(marketplace_id: Optional[str] = None) -> Dict[str, Any
         cur.execute(f"""
             UPDATE t_p86529894_ecommerce_management.user_marketplace_integrations
             SET last_sync_at = CURRENT_TIMESTAMP
-            WHERE marketplace_id = {mp['id']} AND user_id = 1
+            WHERE marketplace_id = {mp['id']} AND user_id = {user_id}
         """)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'products': products_synced,
             'orders': orders_synced,
@@ -195,8 +105,6 @@ def sync_marketplace_data(marketplace_id: Optional[str] = None) -> Dict[str, Any
         })
         
     except ValueError as e:
-        cur.close()
-        conn.close()
         return error_response(str(e), 400)
 
 
@@ -236,7 +144,6 @@ def sync_ozon_data(cur, mp: Dict) -> tuple:
             name = prod_data.get('name', 'Unnamed Product')
             sku = prod_data.get('offer_id', offer_id)
             price = float(prod_data.get('marketing_price', prod_data.get('price', 0)))
-            barcode = prod_data.get('barcode', '')
             
             stocks_data = call_ozon_api('/v3/product/info/stocks', 'POST', {
                 'filter': {'product_id': [str(product_id)]},
@@ -249,45 +156,24 @@ def sync_ozon_data(cur, mp: Dict) -> tuple:
                     for stock in stock_item.get('stocks', []):
                         total_stock += stock.get('present', 0)
             
-            name_escaped = name.replace("'", "''")
-            sku_escaped = sku.replace("'", "''")
-            barcode_escaped = barcode.replace("'", "''")
-            
-            cur.execute(f"SELECT id FROM t_p86529894_ecommerce_management.products WHERE sku = '{sku_escaped}' LIMIT 1")
-            existing = cur.fetchone()
-            
-            if existing:
-                product_db_id = existing['id']
-                cur.execute(f"""
-                    UPDATE t_p86529894_ecommerce_management.products
-                    SET name = '{name_escaped}', price = {price}, stock = {total_stock}, 
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = {product_db_id}
-                """)
-            else:
-                cur.execute(f"""
-                    INSERT INTO t_p86529894_ecommerce_management.products (name, sku, price, stock, category)
-                    VALUES ('{name_escaped}', '{sku_escaped}', {price}, {total_stock}, 'Uncategorized')
-                    RETURNING id
-                """)
-                product_db_id = cur.fetchone()['id']
-            
-            cur.execute(f"""
-                SELECT id FROM t_p86529894_ecommerce_management.marketplace_products 
-                WHERE product_id = {product_db_id} AND marketplace_id = {mp['id']}
-            """)
+            # Уникальные ключи products(sku) и marketplace_products(product_id, marketplace_id)
+            # позволяют обойтись двумя upsert вместо SELECT + UPDATE/INSERT
+            cur.execute("""
+                INSERT INTO t_p86529894_ecommerce_management.products (name, sku, price, stock, category)
+                VALUES (%s, %s, %s, %s, 'Uncategorized')
+                ON CONFLICT (sku) DO UPDATE
+                SET name = EXCLUDED.name, price = EXCLUDED.price, stock = EXCLUDED.stock,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING id
+            """, (name, sku, price, total_stock))
+            product_db_id = cur.fetchone()['id']
             
-            if cur.fetchone():
-                cur.execute(f"""
-                    UPDATE t_p86529894_ecommerce_management.marketplace_products
-                    SET price = {price}, stock = {total_stock}, synced_at = CURRENT_TIMESTAMP
-                    WHERE product_id = {product_db_id} AND marketplace_id = {mp['id']}
-                """)
-            else:
-                cur.execute(f"""
-                    INSERT INTO t_p86529894_ecommerce_management.marketplace_products (product_id, marketplace_id, price, stock, synced_at)
-                    VALUES ({product_db_id}, {mp['id']}, {price}, {total_stock}, CURRENT_TIMESTAMP)
-                """)
+            cur.execute("""
+                INSERT INTO t_p86529894_ecommerce_management.marketplace_products (product_id, marketplace_id, price, stock, synced_at)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (product_id, marketplace_id) DO UPDATE
+                SET price = EXCLUDED.price, stock = EXCLUDED.stock, synced_at = CURRENT_TIMESTAMP
+            """, (product_db_id, mp['id'], price, total_stock))
             
             products_synced += 1
     
@@ -375,7 +261,7 @@ def sync_ozon_data(cur, mp: Dict) -> tuple:
     return products_synced, orders_synced, customers_synced
 
 
-def get_marketplace_specific_data(marketplace_id: Optional[str] = None) -> Dict[str, Any]:
+def get_marketplace_specific_data(marketplace_id: Optional[str] = None, user_id: int = 1) -> Dict[str, Any]:
     """Получение специфичных данных маркетплейса"""
     if not marketplace_id:
         return error_response('Marketplace ID required', 400)
@@ -385,25 +271,22 @@ def get_marketplace_specific_data(marketplace_id: Optional[str] = None) -> Dict[
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT m.*, umi.last_sync_at
         FROM t_p86529894_ecommerce_management.marketplaces m
-        LEFT JOIN t_p86529894_ecommerce_management.user_marketplace_integrations umi ON m.id = umi.marketplace_id AND umi.user_id = 1
+        LEFT JOIN t_p86529894_ecommerce_management.user_marketplace_integrations umi ON m.id = umi.marketplace_id AND umi.user_id = {user_id}
         WHERE m.id = {mp_id}
         LIMIT 1
     """)
     marketplace = cur.fetchone()
     
     if not marketplace:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not found', 404)
     
     cur.execute(f"""
-        SELECT p.*, mp.price as mp_price, mp.stock as mp_stock, mp.synced_at
+        SELECT {PRODUCT_COLUMNS}, mp.price as mp_price, mp.stock as mp_stock, mp.synced_at
         FROM t_p86529894_ecommerce_management.products p
         JOIN t_p86529894_ecommerce_management.marketplace_products mp ON p.id = mp.product_id
         WHERE mp.marketplace_id = {mp_id}
@@ -443,9 +326,6 @@ def get_marketplace_specific_data(marketplace_id: Optional[str] = None) -> Dict[
     """)
     stats_revenue = cur.fetchone()
     
-    cur.close()
-    conn.close()
-    
     return success_response({
         'marketplace': dict(marketplace),
         'products': products,
@@ -458,16 +338,15 @@ def get_marketplace_specific_data(marketplace_id: Optional[str] = None) -> Dict[
     })
 
 
-def get_marketplaces() -> Dict[str, Any]:
+def get_marketplaces(user_id: int = 1) -> Dict[str, Any]:
     """Получение списка всех маркетплейсов"""
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute("SELECT * FROM t_p86529894_ecommerce_management.marketplaces ORDER BY id")
     marketplaces_raw = [dict(row) for row in cur.fetchall()]
     
-    cur.execute("SELECT * FROM t_p86529894_ecommerce_management.user_marketplace_integrations WHERE user_id = 1")
+    cur.execute(f"SELECT * FROM t_p86529894_ecommerce_management.user_marketplace_integrations WHERE user_id = {user_id}")
     integrations = {row['marketplace_id']: dict(row) for row in cur.fetchall()}
     
     cur.execute("SELECT * FROM t_p86529894_ecommerce_management.marketplace_products")
@@ -506,13 +385,10 @@ def get_marketplaces() -> Dict[str, Any]:
             'total_revenue': revenue_totals.get(mp_id, 0)
         })
     
-    cur.close()
-    conn.close()
-    
     return success_response({'marketplaces': marketplaces})
 
 
-def connect_marketplace(body: Dict[str, Any]) -> Dict[str, Any]:
+def connect_marketplace(body: Dict[str, Any], user_id: int = 1) -> Dict[str, Any]:
     """Подключение маркетплейса"""
     marketplace_id = body.get('marketplaceId')
     api_key = body.get('apiKey', '')
@@ -527,20 +403,15 @@ def connect_marketplace(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"SELECT id, slug FROM t_p86529894_ecommerce_management.marketplaces WHERE id = {mp_id} LIMIT 1")
     marketplace = cur.fetchone()
     
     if not marketplace:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not found', 404)
     
     if marketplace['slug'].lower() == 'ozon' and (not api_key or not store_id):
-        cur.close()
-        conn.close()
         return error_response('Ozon requires Client ID and API Key', 400)
     
     api_key_escaped = api_key.replace("'", "''")
@@ -549,7 +420,7 @@ def connect_marketplace(body: Dict[str, Any]) -> Dict[str, Any]:
     
     cur.execute(f"""
         SELECT id FROM t_p86529894_ecommerce_management.user_marketplace_integrations 
-        WHERE marketplace_id = {mp_id} AND user_id = 1
+        WHERE marketplace_id = {mp_id} AND user_id = {user_id}
         LIMIT 1
     """)
     existing = cur.fetchone()
@@ -565,17 +436,14 @@ def connect_marketplace(body: Dict[str, Any]) -> Dict[str, Any]:
         cur.execute(f"""
             INSERT INTO t_p86529894_ecommerce_management.user_marketplace_integrations 
             (user_id, marketplace_id, api_key, store_id, api_secret, connected_at)
-            VALUES (1, {mp_id}, '{api_key_escaped}', '{store_id_escaped}', 
+            VALUES ({user_id}, {mp_id}, '{api_key_escaped}', '{store_id_escaped}', 
                    '{api_secret_escaped}', CURRENT_TIMESTAMP)
         """)
     
-    cur.close()
-    conn.close()
-    
     return success_response({'message': 'Marketplace connected successfully'})
 
 
-def disconnect_marketplace(body: Dict[str, Any]) -> Dict[str, Any]:
+def disconnect_marketplace(body: Dict[str, Any], user_id: int = 1) -> Dict[str, Any]:
     """Отключение маркетплейса"""
     marketplace_id = body.get('marketplaceId')
     
@@ -587,45 +455,40 @@ def disconnect_marketplace(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         DELETE FROM t_p86529894_ecommerce_management.user_marketplace_integrations
-        WHERE marketplace_id = {mp_id} AND user_id = 1
+        WHERE marketplace_id = {mp_id} AND user_id = {user_id}
     """)
     
-    cur.close()
-    conn.close()
-    
     return success_response({'message': 'Marketplace disconnected'})
 
 
-def get_products(marketplace: Optional[str] = None) -> Dict[str, Any]:
+def get_products(marketplace: Optional[str] = None, include_deleted: bool = False) -> Dict[str, Any]:
     """Получение списка товаров"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor(cursor_factory=None)
+    
+    live_sql = 'true' if include_deleted else "p.status <> 'deleted'"
     
     if marketplace:
         marketplace_escaped = marketplace.replace("'", "''")
         cur.execute(f"""
-            SELECT p.*, mp.price as marketplace_price, mp.stock as marketplace_stock
+            SELECT {PRODUCT_COLUMNS}, mp.price as marketplace_price, mp.stock as marketplace_stock
             FROM t_p86529894_ecommerce_management.products p
             JOIN t_p86529894_ecommerce_management.marketplace_products mp ON p.id = mp.product_id
             JOIN t_p86529894_ecommerce_management.marketplaces m ON mp.marketplace_id = m.id
-            WHERE m.slug = '{marketplace_escaped}'
+            WHERE m.slug = '{marketplace_escaped}' AND {live_sql}
             ORDER BY p.created_at DESC
         """)
     else:
-        cur.execute("""
-            SELECT * FROM t_p86529894_ecommerce_management.products 
-            ORDER BY created_at DESC
+        cur.execute(f"""
+            SELECT {PRODUCT_COLUMNS} FROM t_p86529894_ecommerce_management.products p
+            WHERE {live_sql}
+            ORDER BY p.created_at DESC
         """)
     
-    products = [dict(row) for row in cur.fetchall()]
-    
-    cur.close()
-    conn.close()
+    products = fetch_records(cur)
     
     return success_response({'products': products})
 
@@ -645,8 +508,7 @@ def update_product(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid product ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     updates = []
     if price is not None:
@@ -657,8 +519,6 @@ def update_product(body: Dict[str, Any]) -> Dict[str, Any]:
         updates.append(f'stock = {int(stock)}')
     
     if not updates:
-        cur.close()
-        conn.close()
         return error_response('No fields to update', 400)
     
     updates.append('updated_at = CURRENT_TIMESTAMP')
@@ -670,16 +530,12 @@ def update_product(body: Dict[str, Any]) -> Dict[str, Any]:
         WHERE id = {prod_id}
     """)
     
-    cur.close()
-    conn.close()
-    
     return success_response({'message': 'Product updated'})
 
 
 def get_orders(status: Optional[str] = None, marketplace: Optional[str] = None) -> Dict[str, Any]:
     """Получение списка заказов"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor(cursor_factory=None)
     
     where_clauses = []
     
@@ -703,10 +559,7 @@ def get_orders(status: Optional[str] = None, marketplace: Optional[str] = None)
         ORDER BY o.created_at DESC
     """)
     
-    orders = [dict(row) for row in cur.fetchall()]
-    
-    cur.close()
-    conn.close()
+    orders = fetch_records(cur)
     
     return success_response({'orders': orders})
 
@@ -726,8 +579,7 @@ def update_order_status(body: Dict[str, Any]) -> Dict[str, Any]:
     
     status_escaped = status.replace("'", "''")
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         UPDATE t_p86529894_ecommerce_management.orders
@@ -735,9 +587,6 @@ def update_order_status(body: Dict[str, Any]) -> Dict[str, Any]:
         WHERE id = {ord_id}
     """)
     
-    cur.close()
-    conn.close()
-    
     return success_response({'message': 'Order status updated'})
 
 
@@ -756,8 +605,7 @@ def ship_order(body: Dict[str, Any]) -> Dict[str, Any]:
     
     tracking_escaped = tracking_number.replace("'", "''")
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         UPDATE t_p86529894_ecommerce_management.orders
@@ -766,9 +614,6 @@ def ship_order(body: Dict[str, Any]) -> Dict[str, Any]:
         WHERE id = {ord_id}
     """)
     
-    cur.close()
-    conn.close()
-    
     return success_response({'message': 'Order shipped'})
 
 
@@ -778,8 +623,7 @@ def get_analytics(period: str = '30d') -> Dict[str, Any]:
     since_date = datetime.now() - timedelta(days=days)
     previous_since = since_date - timedelta(days=days)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT o.*, m.name as marketplace_name, m.slug as marketplace_slug
@@ -860,9 +704,6 @@ def get_analytics(period: str = '30d') -> Dict[str, Any]:
         for date, stats in sorted(daily_stats_dict.items())
     ]
     
-    cur.close()
-    conn.close()
-    
     return success_response({
         'summary': {
             'total_orders': total_orders,
@@ -876,22 +717,25 @@ def get_analytics(period: str = '30d') -> Dict[str, Any]:
     })
 
 
-def get_dashboard() -> Dict[str, Any]:
+LOW_STOCK_THRESHOLD = 10
+REPLENISHMENT_PLAN_MAX_AGE_HOURS = int(os.environ.get('REPLENISHMENT_PLAN_MAX_AGE_HOURS', '24'))
+
+
+def get_dashboard(user_id: int = 1) -> Dict[str, Any]:
     """Получение данных для главного дашборда"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute("SELECT COUNT(*) as total FROM t_p86529894_ecommerce_management.marketplaces")
     total_marketplaces = cur.fetchone()['total']
     
-    cur.execute("""
+    cur.execute(f"""
         SELECT COUNT(*) as connected 
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations 
-        WHERE user_id = 1
+        WHERE user_id = {user_id}
     """)
     connected_marketplaces = cur.fetchone()['connected']
     
-    cur.execute("SELECT COUNT(*) as total FROM t_p86529894_ecommerce_management.products")
+    cur.execute("SELECT COUNT(*) as total FROM t_p86529894_ecommerce_management.products WHERE status <> 'deleted'")
     total_products = cur.fetchone()['total']
     
     cur.execute("SELECT COUNT(*) as total FROM t_p86529894_ecommerce_management.orders")
@@ -909,18 +753,33 @@ def get_dashboard() -> Dict[str, Any]:
     """)
     recent_orders = [dict(row) for row in cur.fetchall()]
     
+    # План пополнения пересчитывает ml-predictions replenishmentPlan; пока плана нет или он устарел,
+    # дашборд показывает товары с низким текущим остатком
     cur.execute("""
-        SELECT p.*, COALESCE(p.stock, 0) as total_stock
-        FROM t_p86529894_ecommerce_management.products p
-        WHERE COALESCE(p.stock, 0) < 10
-        ORDER BY p.stock ASC
-        LIMIT 5
-    """)
+        SELECT COALESCE(MAX(computed_at) > CURRENT_TIMESTAMP - make_interval(hours => %s), false) as fresh
+        FROM t_p86529894_ecommerce_management.replenishment_plan
+    """, (REPLENISHMENT_PLAN_MAX_AGE_HOURS,))
+    if cur.fetchone()['fresh']:
+        cur.execute(f"""
+            SELECT {PRODUCT_COLUMNS}, rp.available_stock as total_stock, rp.days_of_cover,
+                   rp.reorder_point, rp.reorder_quantity, rp.stockout_risk
+            FROM t_p86529894_ecommerce_management.replenishment_plan rp
+            JOIN t_p86529894_ecommerce_management.products p ON p.id = rp.product_id
+            WHERE rp.stockout_risk > 0 AND p.status <> 'deleted'
+            ORDER BY rp.stockout_risk DESC, rp.days_of_cover ASC
+            LIMIT 5
+        """)
+    else:
+        cur.execute(f"""
+            SELECT {PRODUCT_COLUMNS}, COALESCE(p.stock, 0) as total_stock, NULL as days_of_cover,
+                   NULL as reorder_point, NULL as reorder_quantity, NULL as stockout_risk
+            FROM t_p86529894_ecommerce_management.products p
+            WHERE COALESCE(p.stock, 0) < %s AND p.status <> 'deleted'
+            ORDER BY p.stock ASC
+            LIMIT 5
+        """, (LOW_STOCK_THRESHOLD,))
     low_stock_products = [dict(row) for row in cur.fetchall()]
     
-    cur.close()
-    conn.close()
-    
     return success_response({
         'stats': {
             'total_marketplaces': total_marketplaces,
@@ -934,47 +793,7 @@ def get_dashboard() -> Dict[str, Any]:
     })
 
 
-def cors_response() -> Dict[str, Any]:
-    """CORS preflight response"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
-            'Access-Control-Max-Age': '86400'
-        },
-        'body': ''
-    }
-
-
-def success_response(data: Any) -> Dict[str, Any]:
-    """Success response helper"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps(data, default=str)
-    }
-
-
-def error_response(message: str, status_code: int = 500) -> Dict[str, Any]:
-    """Error response helper"""
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps({'error': message})
-    }
-
-
-def ozon_update_price(body: Dict[str, Any]) -> Dict[str, Any]:
+def ozon_update_price(body: Dict[str, Any], user_id: int = 1) -> Dict[str, Any]:
     """Изменение цены товара на Ozon"""
     marketplace_id = body.get('marketplaceId')
     offer_id = body.get('offerId')
@@ -989,21 +808,18 @@ def ozon_update_price(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT umi.api_key, umi.store_id
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations umi
-        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = 1
+        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     integration = cur.fetchone()
     
     if not integration:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not connected', 404)
     
     client_id = integration['store_id']
@@ -1021,20 +837,15 @@ def ozon_update_price(body: Dict[str, Any]) -> Dict[str, Any]:
     try:
         result = call_ozon_api('/v1/product/import/prices', 'POST', prices_data, client_id, api_key)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'message': 'Price updated on Ozon',
             'result': result
         })
     except Exception as e:
-        cur.close()
-        conn.close()
         return error_response(str(e), 500)
 
 
-def ozon_update_stock(body: Dict[str, Any]) -> Dict[str, Any]:
+def ozon_update_stock(body: Dict[str, Any], user_id: int = 1) -> Dict[str, Any]:
     """Обновление остатков товара на Ozon"""
     marketplace_id = body.get('marketplaceId')
     offer_id = body.get('offerId')
@@ -1049,21 +860,18 @@ def ozon_update_stock(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT umi.api_key, umi.store_id
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations umi
-        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = 1
+        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     integration = cur.fetchone()
     
     if not integration:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not connected', 404)
     
     client_id = integration['store_id']
@@ -1082,20 +890,15 @@ def ozon_update_stock(body: Dict[str, Any]) -> Dict[str, Any]:
     try:
         result = call_ozon_api('/v2/products/stocks', 'POST', stocks_data, client_id, api_key)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'message': 'Stock updated on Ozon',
             'result': result
         })
     except Exception as e:
-        cur.close()
-        conn.close()
         return error_response(str(e), 500)
 
 
-def ozon_get_finance_data(marketplace_id: Optional[str] = None) -> Dict[str, Any]:
+def ozon_get_finance_data(marketplace_id: Optional[str] = None, user_id: int = 1) -> Dict[str, Any]:
     """Получение финансовых данных с Ozon (комиссии, выплаты)"""
     if not marketplace_id:
         return error_response('Marketplace ID required', 400)
@@ -1105,21 +908,18 @@ def ozon_get_finance_data(marketplace_id: Optional[str] = None) -> Dict[str, Any
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT umi.api_key, umi.store_id
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations umi
-        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = 1
+        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     integration = cur.fetchone()
     
     if not integration:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not connected', 404)
     
     client_id = integration['store_id']
@@ -1141,20 +941,15 @@ def ozon_get_finance_data(marketplace_id: Optional[str] = None) -> Dict[str, Any
             'page_size': 100
         }, client_id, api_key)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'transactions': finance_data.get('result', {}).get('operations', []),
             'period': {'from': date_from, 'to': date_to}
         })
     except Exception as e:
-        cur.close()
-        conn.close()
         return error_response(str(e), 500)
 
 
-def ozon_pack_order(body: Dict[str, Any]) -> Dict[str, Any]:
+def ozon_pack_order(body: Dict[str, Any], user_id: int = 1) -> Dict[str, Any]:
     """Упаковка заказа на Ozon"""
     marketplace_id = body.get('marketplaceId')
     posting_number = body.get('postingNumber')
@@ -1167,21 +962,18 @@ def ozon_pack_order(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT umi.api_key, umi.store_id
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations umi
-        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = 1
+        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     integration = cur.fetchone()
     
     if not integration:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not connected', 404)
     
     client_id = integration['store_id']
@@ -1199,20 +991,15 @@ def ozon_pack_order(body: Dict[str, Any]) -> Dict[str, Any]:
             WHERE order_number = '{posting_number_escaped}'
         """)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'message': 'Order packed successfully',
             'result': result
         })
     except Exception as e:
-        cur.close()
-        conn.close()
         return error_response(str(e), 500)
 
 
-def ozon_ship_order(body: Dict[str, Any]) -> Dict[str, Any]:
+def ozon_ship_order(body: Dict[str, Any], user_id: int = 1) -> Dict[str, Any]:
     """Отгрузка заказа на Ozon"""
     marketplace_id = body.get('marketplaceId')
     posting_number = body.get('postingNumber')
@@ -1225,21 +1012,18 @@ def ozon_ship_order(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT umi.api_key, umi.store_id
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations umi
-        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = 1
+        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     integration = cur.fetchone()
     
     if not integration:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not connected', 404)
     
     client_id = integration['store_id']
@@ -1259,20 +1043,15 @@ def ozon_ship_order(body: Dict[str, Any]) -> Dict[str, Any]:
             WHERE order_number = '{posting_number_escaped}'
         """)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'message': 'Order shipped successfully',
             'result': result
         })
     except Exception as e:
-        cur.close()
-        conn.close()
         return error_response(str(e), 500)
 
 
-def ozon_get_returns(marketplace_id: Optional[str] = None) -> Dict[str, Any]:
+def ozon_get_returns(marketplace_id: Optional[str] = None, user_id: int = 1) -> Dict[str, Any]:
     """Получение списка возвратов с Ozon"""
     if not marketplace_id:
         return error_response('Marketplace ID required', 400)
@@ -1282,21 +1061,18 @@ def ozon_get_returns(marketplace_id: Optional[str] = None) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT umi.api_key, umi.store_id
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations umi
-        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = 1
+        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     integration = cur.fetchone()
     
     if not integration:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not connected', 404)
     
     client_id = integration['store_id']
@@ -1311,19 +1087,14 @@ def ozon_get_returns(marketplace_id: Optional[str] = None) -> Dict[str, Any]:
             'offset': 0
         }, client_id, api_key)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'returns': returns_data.get('result', [])
         })
     except Exception as e:
-        cur.close()
-        conn.close()
         return error_response(str(e), 500)
 
 
-def ozon_accept_return(body: Dict[str, Any]) -> Dict[str, Any]:
+def ozon_accept_return(body: Dict[str, Any], user_id: int = 1) -> Dict[str, Any]:
     """Принятие возврата на Ozon"""
     marketplace_id = body.get('marketplaceId')
     return_id = body.get('returnId')
@@ -1336,21 +1107,18 @@ def ozon_accept_return(body: Dict[str, Any]) -> Dict[str, Any]:
     except ValueError:
         return error_response('Invalid marketplace ID', 400)
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"""
         SELECT umi.api_key, umi.store_id
         FROM t_p86529894_ecommerce_management.user_marketplace_integrations umi
-        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = 1
+        WHERE umi.marketplace_id = {mp_id} AND umi.user_id = {user_id}
         LIMIT 1
     """)
     
     integration = cur.fetchone()
     
     if not integration:
-        cur.close()
-        conn.close()
         return error_response('Marketplace not connected', 404)
     
     client_id = integration['store_id']
@@ -1361,14 +1129,62 @@ def ozon_accept_return(body: Dict[str, Any]) -> Dict[str, Any]:
             'return_id': int(return_id)
         }, client_id, api_key)
         
-        cur.close()
-        conn.close()
-        
         return success_response({
             'message': 'Return accepted',
             'result': result
         })
     except Exception as e:
-        cur.close()
-        conn.close()
-        return error_response(str(e), 500)
\ No newline at end of file
+        return error_response(str(e), 500)
+
+
+def body_of(handler: Callable[..., Dict[str, Any]]) -> Callable[[Request], Dict[str, Any]]:
+    return lambda req: handler(req.json(), req.user_id)
+
+
+def marketplace_of(handler: Callable[..., Dict[str, Any]]) -> Callable[[Request], Dict[str, Any]]:
+    return lambda req: handler(req.query.get('marketplaceId'), req.user_id)
+
+
+def authenticate(req: Request) -> None:
+    req.user_id = get_request_user_id(req.event)
+
+
+router = Router('action', cors_methods='GET, POST, PUT, DELETE, OPTIONS',
+                before=authenticate, errors={AuthError: 401})
+
+# Таблица маршрутов: action -> (методы, обработчик); без методов маршрут принимает любой метод
+ROUTES = {
+    'getMarketplaces': ((ANY_METHOD,), lambda req: get_marketplaces(req.user_id)),
+    'connectMarketplace': (('POST',), body_of(connect_marketplace)),
+    'disconnectMarketplace': (('POST',), body_of(disconnect_marketplace)),
+    'syncMarketplace': (('POST',), marketplace_of(sync_marketplace_data)),
+    'getMarketplaceData': ((ANY_METHOD,), marketplace_of(get_marketplace_specific_data)),
+    'getProducts': ((ANY_METHOD,), lambda req: get_products(req.query.get('marketplace'),
+                                                            req.query.get('includeDeleted') == 'true')),
+    'updateProduct': (('POST',), lambda req: update_product(req.json())),
+    'getOrders': ((ANY_METHOD,), lambda req: get_orders(req.query.get('status'), req.query.get('marketplace'))),
+    'updateOrderStatus': (('POST',), lambda req: update_order_status(req.json())),
+    'shipOrder': (('POST',), lambda req: ship_order(req.json())),
+    'getAnalytics': ((ANY_METHOD,), lambda req: get_analytics(req.query.get('period', '30d'))),
+    'getDashboard': ((ANY_METHOD,), lambda req: get_dashboard(req.user_id)),
+    'ozonUpdatePrice': (('POST',), body_of(ozon_update_price)),
+    'ozonUpdateStock': (('POST',), body_of(ozon_update_stock)),
+    'ozonGetFinance': ((ANY_METHOD,), marketplace_of(ozon_get_finance_data)),
+    'ozonPackOrder': (('POST',), body_of(ozon_pack_order)),
+    'ozonShipOrder': (('POST',), body_of(ozon_ship_order)),
+    'ozonGetReturns': ((ANY_METHOD,), marketplace_of(ozon_get_returns)),
+    'ozonAcceptReturn': (('POST',), body_of(ozon_accept_return)),
+}
+for action, (methods, route_handler) in ROUTES.items():
+    router.add(action, route_handler, methods)
+
+
+@compressed
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Центральное API для CRM системы с реальной интеграцией Ozon Seller API
+    Args: event - dict with httpMethod, body, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response dict с данными CRM системы
+    '''
+    return router.dispatch(event, context)
@@ -1,86 +1,42 @@
 import json
-import os
-from typing import Dict, Any, List
+import math
+import time
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
 from collections import defaultdict
+from access_token import AuthError, get_request_claims, has_permission
+from runtime import Request, Router, db_cursor, error_response, lazy_module, success_response
+from serialization import compressed, fetch_records
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: ML модуль для прогнозирования продаж, возвратов и аномалий
-    Args: event - dict with httpMethod, body, queryStringParameters
-          context - object with request_id, function_name
-    Returns: HTTP response dict с ML предсказаниями
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return cors_response()
-    
-    query_params = event.get('queryStringParameters', {}) or {}
-    action = query_params.get('action', '')
-    
-    try:
-        if action == 'salesForecast':
-            product_id = query_params.get('productId')
-            days = int(query_params.get('days', '7'))
-            return sales_forecast(product_id, days)
-        
-        elif action == 'returnsPrediction':
-            product_id = query_params.get('productId')
-            return returns_prediction(product_id)
-        
-        elif action == 'anomalyDetection':
-            marketplace_id = query_params.get('marketplaceId')
-            return anomaly_detection(marketplace_id)
-        
-        elif action == 'demandForecast':
-            category = query_params.get('category')
-            return demand_forecast(category)
-        
-        elif action == 'getPredictions':
-            prediction_type = query_params.get('type')
-            return get_predictions(prediction_type)
-        
-        else:
-            return error_response('Invalid action', 400)
-    
-    except Exception as e:
-        return error_response(str(e), 500)
-
+np = lazy_module('numpy')
 
-def get_db_connection():
-    """Получение подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(database_url)
-    conn.set_session(autocommit=True)
-    return conn
+HISTORY_WINDOW_DAYS = 30
 
 
 def sales_forecast(product_id: str, days: int = 7) -> Dict[str, Any]:
     """Прогноз продаж товара на следующие N дней"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
+    # Диапазон по order_items.order_created_at: индекс (product_id, order_created_at) и отсечение секций
+    until = datetime.now()
+    since = until - timedelta(days=HISTORY_WINDOW_DAYS)
     cur.execute("""
         SELECT 
-            DATE(o.order_date) as date,
+            date_trunc('day', oi.order_created_at)::date as date,
             COUNT(oi.id) as sales_count,
             COALESCE(SUM(oi.quantity), 0) as total_quantity
-        FROM orders o
-        JOIN order_items oi ON o.id = oi.order_id
+        FROM order_items oi
         WHERE oi.product_id = %s
-            AND o.order_date >= NOW() - INTERVAL '30 days'
-        GROUP BY DATE(o.order_date)
+            AND oi.order_created_at >= %s
+            AND oi.order_created_at < %s
+        GROUP BY 1
         ORDER BY date
-    """, (product_id,))
+    """, (product_id, since, until))
     
     historical_data = cur.fetchall()
     
     if not historical_data:
-        cur.close()
-        conn.close()
         return success_response({
             'productId': product_id,
             'forecast': [],
@@ -121,9 +77,6 @@ def sales_forecast(product_id: str, days: int = 7) -> Dict[str, Any]:
         datetime.now().date()
     ))
     
-    cur.close()
-    conn.close()
-    
     return success_response({
         'productId': product_id,
         'forecast': forecast,
@@ -135,8 +88,7 @@ def sales_forecast(product_id: str, days: int = 7) -> Dict[str, Any]:
 
 def returns_prediction(product_id: str) -> Dict[str, Any]:
     """Предсказание вероятности возврата товара"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute("""
         SELECT 
@@ -154,8 +106,6 @@ def returns_prediction(product_id: str) -> Dict[str, Any]:
     result = cur.fetchone()
     
     if not result or result['total_orders'] == 0:
-        cur.close()
-        conn.close()
         return success_response({
             'productId': product_id,
             'returnProbability': 0.05,
@@ -192,9 +142,6 @@ def returns_prediction(product_id: str) -> Dict[str, Any]:
         datetime.now().date()
     ))
     
-    cur.close()
-    conn.close()
-    
     return success_response({
         'productId': product_id,
         **prediction_data
@@ -203,26 +150,26 @@ def returns_prediction(product_id: str) -> Dict[str, Any]:
 
 def anomaly_detection(marketplace_id: str) -> Dict[str, Any]:
     """Обнаружение аномалий в продажах маркетплейса"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
+    until = datetime.now()
+    since = until - timedelta(days=HISTORY_WINDOW_DAYS)
     cur.execute("""
         SELECT 
-            DATE(order_date) as date,
+            date_trunc('day', created_at)::date as date,
             COUNT(*) as orders_count,
             COALESCE(SUM(total_amount), 0) as revenue
         FROM orders
         WHERE marketplace_id = %s
-            AND order_date >= NOW() - INTERVAL '30 days'
-        GROUP BY DATE(order_date)
+            AND created_at >= %s
+            AND created_at < %s
+        GROUP BY 1
         ORDER BY date
-    """, (marketplace_id,))
+    """, (marketplace_id, since, until))
     
     daily_stats = cur.fetchall()
     
     if len(daily_stats) < 7:
-        cur.close()
-        conn.close()
         return success_response({
             'marketplaceId': marketplace_id,
             'anomalies': [],
@@ -268,9 +215,6 @@ def anomaly_detection(marketplace_id: str) -> Dict[str, Any]:
         datetime.now().date()
     ))
     
-    cur.close()
-    conn.close()
-    
     return success_response({
         'marketplaceId': marketplace_id,
         'anomalies': anomalies,
@@ -279,59 +223,326 @@ def anomaly_detection(marketplace_id: str) -> Dict[str, Any]:
     })
 
 
-def demand_forecast(category: str) -> Dict[str, Any]:
-    """Прогноз спроса по категории товаров"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
+DEMAND_WINDOW_DAYS = 30
+DEMAND_COVER_DAYS = 14
+DEMAND_CACHE_TTL = 300
+
+_demand_cache: Dict[str, Any] = {'expires_at': 0.0, 'categories': {}}
+
+
+def compute_category_demand(cur, window_days: int = DEMAND_WINDOW_DAYS,
+                            cover_days: int = DEMAND_COVER_DAYS) -> Dict[str, Dict[str, Any]]:
+    """Расчет спроса по всем категориям за один сгруппированный проход"""
     cur.execute("""
-        SELECT 
-            p.name,
+        WITH sales AS (
+            SELECT
+                oi.product_id,
+                COUNT(oi.id) as sales_count,
+                SUM(oi.quantity) as total_quantity,
+                AVG(oi.price) as avg_price
+            FROM order_items oi
+            WHERE oi.order_created_at >= NOW() - make_interval(days => %s)
+            GROUP BY oi.product_id
+        )
+        SELECT
             p.id,
-            COUNT(oi.id) as sales_count,
-            COALESCE(SUM(oi.quantity), 0) as total_quantity,
-            COALESCE(AVG(oi.price), 0) as avg_price
+            p.name,
+            p.category,
+            p.stock,
+            COALESCE(s.sales_count, 0) as sales_count,
+            COALESCE(s.total_quantity, 0) as total_quantity,
+            COALESCE(s.avg_price, 0) as avg_price,
+            SUM(COALESCE(s.total_quantity, 0)) OVER (PARTITION BY p.category) as category_quantity
         FROM products p
-        LEFT JOIN order_items oi ON p.id = oi.product_id
-        LEFT JOIN orders o ON oi.order_id = o.id
-        WHERE p.category = %s
-            AND (o.order_date >= NOW() - INTERVAL '30 days' OR o.order_date IS NULL)
-        GROUP BY p.id, p.name
-        ORDER BY total_quantity DESC
-        LIMIT 10
-    """, (category,))
-    
-    products = cur.fetchall()
-    
-    total_sales = sum(row['total_quantity'] for row in products)
-    
-    forecast = []
-    for product in products:
-        demand_score = (product['total_quantity'] / total_sales * 100) if total_sales > 0 else 0
-        
-        forecast.append({
-            'productId': product['id'],
-            'productName': product['name'],
-            'salesCount': product['sales_count'],
-            'totalQuantity': product['total_quantity'],
-            'demandScore': round(demand_score, 2),
-            'recommendedStock': int(product['total_quantity'] * 1.5)
+        LEFT JOIN sales s ON s.product_id = p.id
+        WHERE p.status <> 'deleted'
+        ORDER BY p.category, total_quantity DESC, p.id
+    """, (window_days,))
+
+    categories: Dict[str, Dict[str, Any]] = {}
+    for row in cur.fetchall():
+        category = row['category']
+        entry = categories.get(category)
+        if entry is None:
+            entry = categories[category] = {
+                'category': category,
+                'forecast': [],
+                'totalSales': int(row['category_quantity']),
+                'dailyVelocity': round(float(row['category_quantity']) / window_days, 3),
+                'windowDays': window_days,
+                'coverDays': cover_days
+            }
+
+        quantity = int(row['total_quantity'])
+        category_quantity = float(row['category_quantity'])
+        velocity = quantity / window_days
+        recommended_stock = int(math.ceil(velocity * cover_days))
+        stock = row['stock'] or 0
+
+        entry['forecast'].append({
+            'productId': row['id'],
+            'productName': row['name'],
+            'salesCount': int(row['sales_count']),
+            'totalQuantity': quantity,
+            'avgPrice': round(float(row['avg_price']), 2),
+            'demandScore': round(quantity / category_quantity * 100, 2) if category_quantity > 0 else 0,
+            'dailyVelocity': round(velocity, 3),
+            'daysOfCover': round(stock / velocity, 1) if velocity > 0 else None,
+            'recommendedStock': recommended_stock
+        })
+
+    return categories
+
+
+def get_category_demand() -> Dict[str, Dict[str, Any]]:
+    """Спрос по категориям с кэшированием в теплом контейнере"""
+    now = time.monotonic()
+    if _demand_cache['expires_at'] > now:
+        return _demand_cache['categories']
+
+    cur = db_cursor()
+    categories = compute_category_demand(cur)
+
+    _demand_cache['categories'] = categories
+    _demand_cache['expires_at'] = now + DEMAND_CACHE_TTL
+    return categories
+
+
+def demand_forecast(category: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+    """Прогноз спроса по категории товаров"""
+    categories = get_category_demand()
+
+    if not category:
+        return success_response({
+            'categories': [
+                {**entry, 'forecast': entry['forecast'][:limit]}
+                for entry in categories.values()
+            ]
+        })
+
+    entry = categories.get(category)
+    if entry is None:
+        return success_response({
+            'category': category,
+            'forecast': [],
+            'totalSales': 0
         })
+
+    return success_response({**entry, 'forecast': entry['forecast'][:limit]})
+
+
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_SAFETY_DAYS = 3
+
+
+def replenishment_plan(lead_time_days: int = DEFAULT_LEAD_TIME_DAYS,
+                       safety_days: int = DEFAULT_SAFETY_DAYS) -> Dict[str, Any]:
+    """Пересчет точек перезаказа для всего каталога одним запросом"""
+    if lead_time_days < 0 or safety_days < 0:
+        return error_response('leadTimeDays and safetyDays must be non-negative', 400)
+
+    cur = db_cursor()
+
+    # Синхронизация пишет остаток Ozon и в products, и в marketplace_products,
+    # поэтому доступный остаток - максимум из двух, а не сумма
+    cur.execute("""
+        WITH sales AS (
+            SELECT oi.product_id, SUM(oi.quantity)::numeric / %(window)s as velocity
+            FROM order_items oi
+            WHERE oi.order_created_at >= NOW() - make_interval(days => %(window)s)
+            GROUP BY oi.product_id
+        ),
+        mp_stock AS (
+            SELECT product_id, SUM(stock) as stock
+            FROM marketplace_products
+            GROUP BY product_id
+        ),
+        stock AS (
+            SELECT
+                p.id as product_id,
+                COALESCE(s.velocity, 0) as velocity,
+                COALESCE(p.stock, 0) as stock,
+                COALESCE(m.stock, 0) as marketplace_stock,
+                GREATEST(COALESCE(p.stock, 0), COALESCE(m.stock, 0)) as available_stock
+            FROM products p
+            LEFT JOIN sales s ON s.product_id = p.id
+            LEFT JOIN mp_stock m ON m.product_id = p.id
+            WHERE p.status <> 'deleted'
+        )
+        INSERT INTO replenishment_plan
+        (product_id, daily_velocity, stock, marketplace_stock, available_stock,
+         lead_time_days, safety_days, days_of_cover, reorder_point, reorder_quantity,
+         stockout_risk, computed_at)
+        SELECT
+            product_id,
+            velocity,
+            stock,
+            marketplace_stock,
+            available_stock,
+            %(lead)s,
+            %(safety)s,
+            CASE WHEN velocity > 0 THEN available_stock / velocity END,
+            CEIL(velocity * (%(lead)s + %(safety)s)),
+            GREATEST(0, CEIL(velocity * (%(lead)s + %(safety)s + %(cover)s)) - available_stock),
+            CASE
+                WHEN velocity = 0 THEN 0
+                WHEN available_stock <= 0 THEN 1
+                ELSE LEAST(1, (%(lead)s + %(safety)s) * velocity / available_stock)
+            END,
+            CURRENT_TIMESTAMP
+        FROM stock
+        ON CONFLICT (product_id) DO UPDATE SET
+            daily_velocity = EXCLUDED.daily_velocity,
+            stock = EXCLUDED.stock,
+            marketplace_stock = EXCLUDED.marketplace_stock,
+            available_stock = EXCLUDED.available_stock,
+            lead_time_days = EXCLUDED.lead_time_days,
+            safety_days = EXCLUDED.safety_days,
+            days_of_cover = EXCLUDED.days_of_cover,
+            reorder_point = EXCLUDED.reorder_point,
+            reorder_quantity = EXCLUDED.reorder_quantity,
+            stockout_risk = EXCLUDED.stockout_risk,
+            computed_at = EXCLUDED.computed_at
+    """, {
+        'window': DEMAND_WINDOW_DAYS,
+        'cover': DEMAND_COVER_DAYS,
+        'lead': lead_time_days,
+        'safety': safety_days
+    })
+    planned = cur.rowcount
+
+    cur.execute("""
+        SELECT rp.product_id, p.name, rp.available_stock, rp.daily_velocity,
+               rp.days_of_cover, rp.reorder_point, rp.reorder_quantity, rp.stockout_risk
+        FROM replenishment_plan rp
+        JOIN products p ON p.id = rp.product_id
+        WHERE rp.stockout_risk > 0
+        ORDER BY rp.stockout_risk DESC, rp.days_of_cover ASC
+        LIMIT 20
+    """)
+    at_risk = [dict(row) for row in cur.fetchall()]
+
+    return success_response({
+        'productsPlanned': planned,
+        'leadTimeDays': lead_time_days,
+        'safetyDays': safety_days,
+        'atRisk': at_risk
+    })
+
+
+RFM_QUANTILES = [0.2, 0.4, 0.6, 0.8]
+RFM_FULL_RUN_DAYS = 7
+RFM_WRITE_PAGE_SIZE = 5000
+
+
+def rfm_scores(values: 'np.ndarray', edges: 'np.ndarray', reverse: bool = False) -> 'np.ndarray':
+    """Квантильные баллы 1..5; для давности меньше - лучше"""
+    scores = np.searchsorted(edges, values, side='right') + 1
+    return 6 - scores if reverse else scores
+
+
+def rfm_segments(r: 'np.ndarray', f: 'np.ndarray', m: 'np.ndarray', has_orders: 'np.ndarray') -> 'np.ndarray':
+    """Сегменты по баллам R/F/M, порядок условий задает приоритет"""
+    return np.select(
+        [
+            ~has_orders,
+            (r >= 4) & (f >= 4) & (m >= 4),
+            (r >= 3) & (f >= 4),
+            (r >= 4) & (f <= 1),
+            (m >= 5),
+            (r <= 2) & (f >= 3),
+            (r <= 1)
+        ],
+        ['no_orders', 'champions', 'loyal', 'new', 'big_spenders', 'at_risk', 'lost'],
+        default='regular'
+    )
+
+
+def rfm_segmentation(full: bool = False) -> Dict[str, Any]:
+    """RFM-сегментация клиентов: полный пересчет или только измененные с прошлого запуска"""
+    cur = db_cursor(cursor_factory=None)
+    
+    cur.execute("SELECT NOW()::timestamp")
+    run_started = cur.fetchone()[0]
+    
+    cur.execute("SELECT last_run_at, last_full_run_at, state FROM ml_job_state WHERE job = 'rfm'")
+    job = cur.fetchone()
+    # Давность меняется для всех клиентов со временем, поэтому полный пересчет периодически обязателен
+    if not job or not job[1] or not job[2].get('edges') or run_started - job[1] > timedelta(days=RFM_FULL_RUN_DAYS):
+        full = True
+    
+    touched_sql = '' if full else 'WHERE c.updated_at > %s'
+    cur.execute(f"""
+        SELECT
+            c.id,
+            EXTRACT(EPOCH FROM (%s - MAX(o.created_at))) / 86400 as recency_days,
+            COUNT(o.id) as frequency,
+            COALESCE(SUM(o.total_amount), 0) as monetary
+        FROM customers c
+        LEFT JOIN orders o ON o.customer_id = c.id AND o.status NOT IN ('cancelled', 'returned')
+        {touched_sql}
+        GROUP BY c.id
+    """, (run_started,) if full else (run_started, job[0]))
+    rows = cur.fetchall()
+    
+    if not rows:
+        segments_count: Dict[str, int] = {}
+    else:
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        recency = np.array([np.nan if row[1] is None else float(row[1]) for row in rows])
+        frequency = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        monetary = np.fromiter((float(row[3]) for row in rows), dtype=np.float64, count=len(rows))
+        has_orders = frequency > 0
+        
+        if full:
+            buyers = has_orders if has_orders.any() else np.ones(len(rows), dtype=bool)
+            edges = {
+                'recency': np.quantile(np.nan_to_num(recency[buyers]), RFM_QUANTILES).tolist(),
+                'frequency': np.quantile(frequency[buyers], RFM_QUANTILES).tolist(),
+                'monetary': np.quantile(monetary[buyers], RFM_QUANTILES).tolist()
+            }
+        else:
+            edges = job[2]['edges']
+        
+        r = np.where(has_orders, rfm_scores(np.nan_to_num(recency, nan=np.inf), np.array(edges['recency']), reverse=True), 1)
+        f = rfm_scores(frequency, np.array(edges['frequency']))
+        m = rfm_scores(monetary, np.array(edges['monetary']))
+        segments = rfm_segments(r, f, m, has_orders)
+        
+        # Клиенты с прежними баллами не перезаписываются: иначе каждый запуск попадал бы в change_log
+        execute_values(cur, """
+            UPDATE customers c
+            SET rfm_recency = v.r, rfm_frequency = v.f, rfm_monetary = v.m,
+                segment = v.segment, segmented_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) as v(id, r, f, m, segment)
+            WHERE c.id = v.id
+              AND (c.rfm_recency, c.rfm_frequency, c.rfm_monetary, c.segment) IS DISTINCT FROM (v.r, v.f, v.m, v.segment)
+        """, list(zip(ids.tolist(), r.tolist(), f.tolist(), m.tolist(), segments.tolist())),
+            page_size=RFM_WRITE_PAGE_SIZE)
+        
+        names, counts = np.unique(segments, return_counts=True)
+        segments_count = dict(zip(names.tolist(), counts.tolist()))
     
-    cur.close()
-    conn.close()
+    state = {'edges': edges} if rows else (job[2] if job else {})
+    cur.execute("""
+        INSERT INTO ml_job_state (job, last_run_at, last_full_run_at, state)
+        VALUES ('rfm', %s, %s, %s)
+        ON CONFLICT (job) DO UPDATE SET
+            last_run_at = EXCLUDED.last_run_at,
+            last_full_run_at = COALESCE(EXCLUDED.last_full_run_at, ml_job_state.last_full_run_at),
+            state = EXCLUDED.state
+    """, (run_started, run_started if full else None, json.dumps(state)))
     
     return success_response({
-        'category': category,
-        'forecast': forecast,
-        'totalSales': total_sales
+        'mode': 'full' if full else 'incremental',
+        'customersScored': len(rows),
+        'segments': segments_count
     })
 
 
 def get_predictions(prediction_type: str = None) -> Dict[str, Any]:
     """Получение сохраненных предсказаний"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor(cursor_factory=None)
     
     query = """
         SELECT * FROM ml_predictions
@@ -346,53 +557,45 @@ def get_predictions(prediction_type: str = None) -> Dict[str, Any]:
     query += " ORDER BY created_at DESC LIMIT 50"
     
     cur.execute(query, params)
-    predictions = cur.fetchall()
-    
-    cur.close()
-    conn.close()
+    predictions = fetch_records(cur)
     
     return success_response({
-        'predictions': [dict(p) for p in predictions],
+        'predictions': predictions,
         'total': len(predictions)
     })
 
 
-def cors_response() -> Dict[str, Any]:
-    """CORS preflight response"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-            'Access-Control-Max-Age': '86400'
-        },
-        'body': '',
-        'isBase64Encoded': False
-    }
+def check_access(req: Request) -> Optional[Dict[str, Any]]:
+    claims = get_request_claims(req.event)
+    if claims is not None and not has_permission(claims, 'view_ml_predictions'):
+        return error_response('Permission denied', 403)
+    return None
 
 
-def success_response(data: Any) -> Dict[str, Any]:
-    """Успешный ответ"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps(data, default=str)
-    }
+router = Router('action', before=check_access, errors={AuthError: 401})
+
+# Таблица маршрутов: action -> обработчик, метод запроса не важен
+ROUTES = {
+    'salesForecast': lambda req: sales_forecast(req.query.get('productId'), int(req.query.get('days', '7'))),
+    'returnsPrediction': lambda req: returns_prediction(req.query.get('productId')),
+    'anomalyDetection': lambda req: anomaly_detection(req.query.get('marketplaceId')),
+    'demandForecast': lambda req: demand_forecast(req.query.get('category'), int(req.query.get('limit', '10'))),
+    'replenishmentPlan': lambda req: replenishment_plan(
+        int(req.query.get('leadTimeDays', str(DEFAULT_LEAD_TIME_DAYS))),
+        int(req.query.get('safetyDays', str(DEFAULT_SAFETY_DAYS)))),
+    'rfmSegmentation': lambda req: rfm_segmentation(req.query.get('full') == 'true'),
+    'getPredictions': lambda req: get_predictions(req.query.get('type')),
+}
+for action, route_handler in ROUTES.items():
+    router.add(action, route_handler)
 
 
-def error_response(message: str, status_code: int = 400) -> Dict[str, Any]:
-    """Ответ с ошибкой"""
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps({'error': message})
-    }
\ No newline at end of file
+@compressed
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: ML модуль для прогнозирования продаж, возвратов и аномалий
+    Args: event - dict with httpMethod, body, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response dict с ML предсказаниями
+    '''
+    return router.dispatch(event, context)
@@ -0,0 +1,230 @@
+'''
+Business: Общий каркас обработчиков: таблица маршрутов, замер времени маршрута, закрытие соединений с БД
+Args: Router(key) - маршрут ищется в словаре по (метод, ключ запроса) за O(1);
+      get_db_connection() - соединение, которое закроется по завершении запроса даже при исключении;
+      db_cursor() - курсор на соединении текущего запроса для функций, которым Request не передается;
+      lazy_module(name) - модуль импортируется при первом обращении, а не на холодном старте
+Returns: HTTP-ответы формата облачной функции: statusCode, headers, body, isBase64Encoded
+Файл одинаковый во всех функциях (auth, api, crm-api, ml-predictions, ozon-webhook) - меняйте копии вместе
+'''
+
+import importlib
+import json
+import os
+import time
+import traceback
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from serialization import dumps
+
+ANY_METHOD = '*'
+
+route_stats: Dict[str, Dict[str, float]] = {}
+
+# Запрос, который сейчас обрабатывает Router.dispatch. Свой у каждого потока и задачи,
+# поэтому параллельные вызовы в одном теплом контейнере не закрывают чужие соединения
+_current_request: ContextVar[Optional['Request']] = ContextVar('current_request', default=None)
+
+
+class lazy_module:
+    '''Заместитель модуля: тяжелая зависимость грузится только маршрутом, которому она нужна'''
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def get_db_connection(autocommit: bool = True):
+    '''Соединение регистрируется в текущем запросе и закрывается Router.dispatch после ответа.
+    Вне dispatch (скрипты) закрывать соединение должен вызывающий'''
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError('DATABASE_URL not set')
+    conn = psycopg2.connect(database_url)
+    conn.set_session(autocommit=autocommit)
+    request = _current_request.get()
+    if request is not None:
+        request._connections.append(conn)
+    return conn
+
+
+def db_cursor(cursor_factory: Any = RealDictCursor):
+    '''Новый курсор на соединении текущего запроса; закрывается вместе с соединением'''
+    request = _current_request.get()
+    if request is None:
+        raise RuntimeError('db_cursor() called outside Router.dispatch')
+    return request.conn.cursor(cursor_factory=cursor_factory)
+
+
+def json_response(data: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    response_headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    if headers:
+        response_headers.update(headers)
+    return {
+        'statusCode': status_code,
+        'headers': response_headers,
+        'isBase64Encoded': False,
+        'body': dumps(data)
+    }
+
+
+def success_response(data: Any) -> Dict[str, Any]:
+    return json_response(data)
+
+
+def error_response(message: str, status_code: int = 500) -> Dict[str, Any]:
+    return json_response({'error': message}, status_code)
+
+
+def cors_response(methods: str = 'GET, POST, OPTIONS',
+                  headers: str = 'Content-Type, X-User-Id, X-Auth-Token') -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': headers,
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+class Request:
+    '''Разобранный запрос; соединение и курсор открываются при первом обращении'''
+
+    def __init__(self, event: Dict[str, Any], context: Any, router: 'Router'):
+        self.event = event
+        self.context = context
+        self.method: str = event.get('httpMethod', router.default_method)
+        self.query: Dict[str, str] = event.get('queryStringParameters') or {}
+        self.headers: Dict[str, str] = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        self.user_id: Any = None
+        self._router = router
+        self._conn = None
+        self._cursor = None
+        self._json = None
+        self._connections: List[Any] = []
+
+    def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.headers.get(name.lower(), default)
+
+    def json(self) -> Any:
+        if self._json is None:
+            self._json = json.loads(self.event.get('body') or '{}')
+        return self._json
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = get_db_connection(self._router.autocommit)
+        return self._conn
+
+    @property
+    def cursor(self):
+        if self._cursor is None:
+            self._cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+        return self._cursor
+
+    def close(self) -> None:
+        '''Закрывает только соединения этого запроса'''
+        while self._connections:
+            conn = self._connections.pop()
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+        self._conn = None
+        self._cursor = None
+
+
+RouteHandler = Callable[[Request], Dict[str, Any]]
+
+
+class Router:
+    '''Таблица маршрутов (метод, ключ) -> обработчик вместо цепочки if/elif.
+    Ключ - значение query-параметра key или результат key(request)'''
+
+    def __init__(self, key: Union[str, Callable[[Request], str]],
+                 not_found: Optional[RouteHandler] = None,
+                 autocommit: bool = True, cors_methods: str = 'GET, POST, OPTIONS',
+                 cors_headers: str = 'Content-Type, X-User-Id, X-Auth-Token',
+                 before: Optional[Callable[[Request], Optional[Dict[str, Any]]]] = None,
+                 errors: Optional[Dict[Type[Exception], int]] = None,
+                 on_error: Optional[Callable[[Request, Exception], Dict[str, Any]]] = None,
+                 default_method: str = 'GET'):
+        self.key = key
+        self.not_found = not_found or (lambda req: error_response('Invalid action', 400))
+        self.autocommit = autocommit
+        self.cors_methods = cors_methods
+        self.cors_headers = cors_headers
+        self.before = before
+        self.errors = errors or {}
+        self.on_error = on_error
+        self.default_method = default_method
+        self.routes: Dict[Tuple[str, str], Tuple[str, RouteHandler]] = {}
+
+    def add(self, key: str, handler: RouteHandler, methods: Iterable[str] = (ANY_METHOD,)) -> None:
+        for method in methods:
+            self.routes[(method, key)] = (key, handler)
+
+    def route(self, key: str, methods: Iterable[str] = (ANY_METHOD,)) -> Callable[[RouteHandler], RouteHandler]:
+        def register(handler: RouteHandler) -> RouteHandler:
+            self.add(key, handler, methods)
+            return handler
+        return register
+
+    def resolve(self, method: str, key: str) -> Optional[Tuple[str, RouteHandler]]:
+        return self.routes.get((method, key)) or self.routes.get((ANY_METHOD, key))
+
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        request = Request(event, context, self)
+        if request.method == 'OPTIONS':
+            return cors_response(self.cors_methods, self.cors_headers)
+
+        name = 'not_found'
+        started = time.perf_counter()
+        token = _current_request.set(request)
+        try:
+            # Маршрут ищется до before, чтобы ответы 400/401 из before попали в статистику своего маршрута
+            key = self.key(request) if callable(self.key) else request.query.get(self.key, '')
+            found = self.resolve(request.method, key)
+            if found:
+                name = found[0]
+            response = self.before(request) if self.before else None
+            if response is None:
+                response = found[1](request) if found else self.not_found(request)
+        except Exception as e:
+            status_code = next((code for error_type, code in self.errors.items() if isinstance(e, error_type)), 500)
+            if status_code == 500:
+                print(f'route {name} failed: {e}\n{traceback.format_exc()}')
+            if self.on_error and status_code == 500:
+                response = self.on_error(request, e)
+            else:
+                response = error_response(str(e), status_code)
+        finally:
+            request.close()
+            _current_request.reset(token)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = route_stats.setdefault(name, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        print(f'route {name} {request.method} {response.get("statusCode")} {elapsed_ms:.1f} ms')
+
+        headers = response.setdefault('headers', {})
+        timing = f'route;desc="{name}";dur={elapsed_ms:.1f}'
+        headers['Server-Timing'] = f'{headers["Server-Timing"]}, {timing}' if headers.get('Server-Timing') else timing
+        headers.setdefault('Timing-Allow-Origin', '*')
+        return response
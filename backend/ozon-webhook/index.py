@@ -1,56 +1,6 @@
-import json
-import os
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Optional
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
-
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: Прием вебхуков от Ozon в реальном времени - новые заказы, отмены, обновления
-    Args: event - dict with httpMethod, body, headers
-          context - object with request_id
-    Returns: HTTP response 200 OK для подтверждения получения
-    '''
-    method: str = event.get('httpMethod', 'POST')
-    
-    if method == 'OPTIONS':
-        return cors_response()
-    
-    if method != 'POST':
-        return error_response('Only POST allowed', 405)
-    
-    try:
-        body_str = event.get('body', '{}')
-        webhook_data = json.loads(body_str)
-        
-        message_type = webhook_data.get('message_type', '')
-        
-        if message_type == 'TYPE_NEW_POSTING':
-            handle_new_order(webhook_data)
-        elif message_type == 'TYPE_POSTING_CANCELLED':
-            handle_order_cancelled(webhook_data)
-        elif message_type == 'TYPE_POSTING_STATUS_CHANGED':
-            handle_order_status_changed(webhook_data)
-        else:
-            print(f'Unknown webhook type: {message_type}')
-        
-        return success_response({'status': 'processed'})
-        
-    except Exception as e:
-        import traceback
-        print(f'Webhook error: {str(e)}\n{traceback.format_exc()}')
-        return success_response({'status': 'error_logged'})
-
-
-def get_db_connection():
-    """Получение подключения к базе данных"""
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        raise ValueError('DATABASE_URL not set')
-    conn = psycopg2.connect(database_url)
-    conn.set_session(autocommit=True)
-    return conn
+from runtime import Request, Router, db_cursor, error_response, success_response
 
 
 def handle_new_order(webhook_data: Dict) -> None:
@@ -77,15 +27,12 @@ def handle_new_order(webhook_data: Dict) -> None:
         total_amount += float(product.get('price', 0)) * int(product.get('quantity', 1))
         items_count += int(product.get('quantity', 1))
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     cur.execute(f"SELECT id FROM t_p86529894_ecommerce_management.marketplaces WHERE slug = 'ozon' LIMIT 1")
     marketplace = cur.fetchone()
     
     if not marketplace:
-        cur.close()
-        conn.close()
         print('Ozon marketplace not found in DB')
         return
     
@@ -126,8 +73,6 @@ def handle_new_order(webhook_data: Dict) -> None:
     else:
         print(f'Order {order_number} already exists')
     
-    cur.close()
-    conn.close()
 
 
 def handle_order_cancelled(webhook_data: Dict) -> None:
@@ -135,8 +80,7 @@ def handle_order_cancelled(webhook_data: Dict) -> None:
     posting = webhook_data.get('posting', {})
     order_number = posting.get('posting_number', '')
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     order_number_escaped = order_number.replace("'", "''")
     
@@ -146,9 +90,6 @@ def handle_order_cancelled(webhook_data: Dict) -> None:
         WHERE order_number = '{order_number_escaped}'
     """)
     
-    cur.close()
-    conn.close()
-    
     print(f'🚫 Order cancelled: {order_number}')
 
 
@@ -169,8 +110,7 @@ def handle_order_status_changed(webhook_data: Dict) -> None:
     
     status = status_map.get(new_status, 'processing')
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = db_cursor()
     
     order_number_escaped = order_number.replace("'", "''")
     status_escaped = status.replace("'", "''")
@@ -181,47 +121,63 @@ def handle_order_status_changed(webhook_data: Dict) -> None:
         WHERE order_number = '{order_number_escaped}'
     """)
     
-    cur.close()
-    conn.close()
-    
     print(f'📦 Order status changed: {order_number} -> {status}')
 
 
-def cors_response() -> Dict[str, Any]:
-    """CORS preflight response"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type',
-            'Access-Control-Max-Age': '86400'
-        },
-        'body': ''
-    }
+def only_post(req: Request) -> Optional[Dict[str, Any]]:
+    if req.method != 'POST':
+        return error_response('Only POST allowed', 405)
+    return None
 
 
-def success_response(data: Any) -> Dict[str, Any]:
-    """Success response helper"""
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps(data, default=str)
-    }
+def unknown_message(req: Request) -> Dict[str, Any]:
+    print(f"Unknown webhook type: {req.json().get('message_type', '')}")
+    return success_response({'status': 'processed'})
+
+
+def error_logged(req: Request, error: Exception) -> Dict[str, Any]:
+    # Ozon повторяет доставку при ошибке, поэтому сбой обработки только логируется
+    return success_response({'status': 'error_logged'})
+
+
+def processed(handle: Callable[[Dict], None]) -> Callable[[Request], Dict[str, Any]]:
+    def route(req: Request) -> Dict[str, Any]:
+        handle(req.json())
+        return success_response({'status': 'processed'})
+    return route
+
+
+def message_type_of(req: Request) -> str:
+    # Ключ маршрута считается до only_post: не-POST и неразборчивое тело получают пустой ключ,
+    # чтобы ответ определили only_post (405) и обработчики, а не сбой разбора
+    if req.method != 'POST':
+        return ''
+    try:
+        body = req.json()
+    except ValueError:
+        return ''
+    return body.get('message_type', '') if isinstance(body, dict) else ''
+
 
+router = Router(message_type_of, not_found=unknown_message,
+                cors_methods='POST, OPTIONS', cors_headers='Content-Type', before=only_post,
+                on_error=error_logged, default_method='POST')
 
-def error_response(message: str, status_code: int = 500) -> Dict[str, Any]:
-    """Error response helper"""
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'isBase64Encoded': False,
-        'body': json.dumps({'error': message})
-    }
\ No newline at end of file
+# Таблица маршрутов: message_type вебхука -> обработчик
+ROUTES = {
+    'TYPE_NEW_POSTING': handle_new_order,
+    'TYPE_POSTING_CANCELLED': handle_order_cancelled,
+    'TYPE_POSTING_STATUS_CHANGED': handle_order_status_changed,
+}
+for message_type, handle in ROUTES.items():
+    router.add(message_type, processed(handle), ('POST',))
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Прием вебхуков от Ozon в реальном времени - новые заказы, отмены, обновления
+    Args: event - dict with httpMethod, body, headers
+          context - object with request_id
+    Returns: HTTP response 200 OK для подтверждения получения
+    '''
+    return router.dispatch(event, context)
@@ -0,0 +1,133 @@
+'''
+Business: Быстрая сериализация JSON-ответов (orjson при наличии) и сжатие крупных ответов gzip/brotli
+Args: dumps(data) - тело ответа, fetch_records(cursor) - строки обычного курсора в список dict,
+      @compressed - обертка handler, сжимающая ответ по Accept-Encoding запроса
+Returns: строку JSON в том же виде, что и json.dumps(data, default=str) для Decimal и дат
+Файл одинаковый во всех функциях (auth, api, crm-api, ml-predictions, ozon-webhook) - меняйте копии вместе
+'''
+
+import base64
+import functools
+import gzip
+import json
+import os
+import time
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Decimal и даты отдаются строкой, как раньше с default=str: фронтенд на это рассчитывает
+_STR_TYPES = (Decimal, datetime, date, time_of_day)
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+compression_stats: Dict[str, float] = {
+    'responses': 0,
+    'compressed': 0,
+    'bytes_in': 0,
+    'bytes_out': 0,
+    'cpu_ms': 0.0
+}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, _STR_TYPES):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def dumps(data: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS).decode()
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def fetch_records(cursor) -> List[Dict[str, Any]]:
+    '''Строки обычного (кортежного) курсора: имена колонок берутся один раз на запрос.
+    Объект на строку остается - ответы отдают список объектов, а собирать JSON из кортежей
+    по одному значению на Python медленнее, чем кодировать dict в orjson.
+    Экономия против RealDictCursor - без RealDictRow и разбора description на каждую строку'''
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    '''br, если клиент его принимает и модуль brotli установлен, иначе gzip; q=0 означает отказ'''
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', accepted.get('*', 0)) > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    body = response.get('body')
+    headers = response.setdefault('headers', {})
+    compression_stats['responses'] += 1
+    if not isinstance(body, str) or response.get('isBase64Encoded') or 'Content-Encoding' in headers:
+        return response
+
+    raw = body.encode()
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return response
+    request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    encoding = choose_encoding(request_headers.get('accept-encoding', ''))
+    if encoding is None:
+        return response
+
+    started = time.process_time()
+    if encoding == 'br':
+        encoded = brotli.compress(raw, quality=BROTLI_QUALITY)
+    else:
+        encoded = gzip.compress(raw, compresslevel=GZIP_LEVEL)
+    cpu_ms = (time.process_time() - started) * 1000
+
+    compression_stats['compressed'] += 1
+    compression_stats['bytes_in'] += len(raw)
+    compression_stats['bytes_out'] += len(encoded)
+    compression_stats['cpu_ms'] += cpu_ms
+    print(f'compress {encoding}: {len(raw)} -> {len(encoded)} bytes '
+          f'(ratio {len(raw) / len(encoded):.1f}, cpu {cpu_ms:.1f} ms)')
+
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+    timing = f'compress;dur={cpu_ms:.1f}'
+    headers['Server-Timing'] = f'{headers["Server-Timing"]}, {timing}' if headers.get('Server-Timing') else timing
+    headers['Timing-Allow-Origin'] = '*'
+    headers['X-Uncompressed-Length'] = str(len(raw))
+    response['body'] = base64.b64encode(encoded).decode()
+    response['isBase64Encoded'] = True
+    return response
+
+
+def compressed(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    '''Сжимает ответ handler, если он крупнее COMPRESS_MIN_BYTES и клиент принимает gzip или br'''
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        return compress_response(event, handler(event, context))
+    return wrapper
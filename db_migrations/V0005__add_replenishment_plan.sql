@@ -0,0 +1,20 @@
+CREATE TABLE IF NOT EXISTS replenishment_plan (
+  product_id INTEGER PRIMARY KEY REFERENCES products(id),
+  daily_velocity NUMERIC(12,4) NOT NULL DEFAULT 0,
+  stock INTEGER NOT NULL DEFAULT 0,
+  marketplace_stock INTEGER NOT NULL DEFAULT 0,
+  available_stock INTEGER NOT NULL DEFAULT 0,
+  lead_time_days INTEGER NOT NULL,
+  safety_days INTEGER NOT NULL DEFAULT 0,
+  days_of_cover NUMERIC(10,1),
+  reorder_point INTEGER NOT NULL DEFAULT 0,
+  reorder_quantity INTEGER NOT NULL DEFAULT 0,
+  stockout_risk NUMERIC(5,4) NOT NULL DEFAULT 0,
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_replenishment_plan_risk ON replenishment_plan(stockout_risk DESC, days_of_cover ASC);
+
+COMMENT ON TABLE replenishment_plan IS 'План пополнения: запас в днях и точка перезаказа по каждому товару';
+COMMENT ON COLUMN replenishment_plan.days_of_cover IS 'На сколько дней хватит остатка при текущей скорости продаж (NULL если продаж нет)';
+COMMENT ON COLUMN replenishment_plan.stockout_risk IS 'Риск обнуления остатка до прихода поставки: 0..1';
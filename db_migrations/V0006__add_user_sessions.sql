@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS user_sessions (
+  token_hash CHAR(64) PRIMARY KEY,
+  user_id INTEGER NOT NULL REFERENCES users(id),
+  role VARCHAR(50) NOT NULL,
+  expires_at TIMESTAMP NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions(expires_at);
+
+COMMENT ON TABLE user_sessions IS 'Активные сессии пользователей, токен хранится только в виде SHA-256';
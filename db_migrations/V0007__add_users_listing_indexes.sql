@@ -0,0 +1,3 @@
+CREATE INDEX IF NOT EXISTS idx_users_listing ON users(created_at DESC, id DESC) INCLUDE (email, full_name, role, is_active);
+CREATE INDEX IF NOT EXISTS idx_users_role_listing ON users(role, is_active, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_email_prefix ON users(email text_pattern_ops);
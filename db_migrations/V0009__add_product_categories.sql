@@ -0,0 +1,88 @@
+ALTER TABLE products ADD COLUMN IF NOT EXISTS status VARCHAR(50) DEFAULT 'active';
+
+CREATE TABLE IF NOT EXISTS product_categories (
+  category VARCHAR(100) PRIMARY KEY,
+  product_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE product_categories IS 'Справочник категорий с числом активных товаров, ведется триггером на products';
+
+CREATE OR REPLACE FUNCTION product_categories_adjust(p_category VARCHAR, p_delta INTEGER) RETURNS void AS $$
+BEGIN
+  IF p_category IS NULL OR p_delta = 0 THEN
+    RETURN;
+  END IF;
+  INSERT INTO product_categories (category, product_count, updated_at)
+  VALUES (p_category, GREATEST(p_delta, 0), CURRENT_TIMESTAMP)
+  ON CONFLICT (category) DO UPDATE
+    SET product_count = GREATEST(product_categories.product_count + p_delta, 0),
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггер уровня оператора: пакетная вставка или импорт меняет строку категории
+-- один раз на оператор, а не на каждый товар, и не держит ее блокировку на весь пакет.
+-- Категории обновляются по порядку имени, чтобы параллельные импорты не ловили взаимоблокировку.
+CREATE OR REPLACE FUNCTION products_track_category() RETURNS trigger AS $$
+DECLARE
+  v_row RECORD;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    FOR v_row IN
+      SELECT category, COUNT(*)::integer as delta FROM new_rows
+      WHERE category IS NOT NULL AND COALESCE(status, '') <> 'deleted'
+      GROUP BY category ORDER BY category
+    LOOP
+      PERFORM product_categories_adjust(v_row.category, v_row.delta);
+    END LOOP;
+  ELSIF TG_OP = 'DELETE' THEN
+    FOR v_row IN
+      SELECT category, -COUNT(*)::integer as delta FROM old_rows
+      WHERE category IS NOT NULL AND COALESCE(status, '') <> 'deleted'
+      GROUP BY category ORDER BY category
+    LOOP
+      PERFORM product_categories_adjust(v_row.category, v_row.delta);
+    END LOOP;
+  ELSE
+    FOR v_row IN
+      SELECT category, SUM(delta)::integer as delta FROM (
+        SELECT category, -1 as delta FROM old_rows WHERE COALESCE(status, '') <> 'deleted'
+        UNION ALL
+        SELECT category, 1 as delta FROM new_rows WHERE COALESCE(status, '') <> 'deleted'
+      ) changed
+      WHERE category IS NOT NULL
+      GROUP BY category HAVING SUM(delta) <> 0 ORDER BY category
+    LOOP
+      PERFORM product_categories_adjust(v_row.category, v_row.delta);
+    END LOOP;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы переходов нельзя объявить у триггера на несколько событий или со списком колонок,
+-- поэтому триггеров три; UPDATE без изменения категории и статуса дает нулевую разницу
+DROP TRIGGER IF EXISTS trg_products_track_category ON products;
+DROP TRIGGER IF EXISTS trg_products_track_category_insert ON products;
+DROP TRIGGER IF EXISTS trg_products_track_category_update ON products;
+DROP TRIGGER IF EXISTS trg_products_track_category_delete ON products;
+CREATE TRIGGER trg_products_track_category_insert
+  AFTER INSERT ON products
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION products_track_category();
+CREATE TRIGGER trg_products_track_category_update
+  AFTER UPDATE ON products
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION products_track_category();
+CREATE TRIGGER trg_products_track_category_delete
+  AFTER DELETE ON products
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION products_track_category();
+
+INSERT INTO product_categories (category, product_count)
+SELECT category, COUNT(*)
+FROM products
+WHERE category IS NOT NULL AND COALESCE(status, '') <> 'deleted'
+GROUP BY category
+ON CONFLICT (category) DO UPDATE SET product_count = EXCLUDED.product_count, updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,20 @@
+UPDATE products SET status = 'active' WHERE status IS NULL;
+ALTER TABLE products ALTER COLUMN status SET DEFAULT 'active';
+ALTER TABLE products ALTER COLUMN status SET NOT NULL;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+UPDATE products SET deleted_at = updated_at WHERE status = 'deleted' AND deleted_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_products_live_created ON products(created_at DESC, id DESC) WHERE status <> 'deleted';
+CREATE INDEX IF NOT EXISTS idx_products_live_category ON products(category, created_at DESC, id DESC) WHERE status <> 'deleted';
+CREATE INDEX IF NOT EXISTS idx_products_deleted_at ON products(deleted_at) WHERE status = 'deleted';
+
+CREATE TABLE IF NOT EXISTS products_archive (
+  id INTEGER PRIMARY KEY,
+  data JSONB NOT NULL,
+  deleted_at TIMESTAMP,
+  archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN products.deleted_at IS 'Когда товар помечен удаленным (status = deleted)';
+COMMENT ON TABLE products_archive IS 'Давно удаленные товары, перенесенные из products фоновой очисткой';
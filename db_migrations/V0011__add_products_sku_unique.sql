@@ -0,0 +1,19 @@
+-- Повторяющиеся артикулы не дали бы построить уникальный индекс. Артикул остается
+-- у живого и последним измененного товара, остальным дописывается суффикс с id:
+-- строки не удаляются, потому что на товары ссылаются order_items
+UPDATE products p
+SET sku = left(p.sku, 100 - length('~dup' || p.id)) || '~dup' || p.id,
+    updated_at = CURRENT_TIMESTAMP
+FROM (
+  SELECT id, row_number() OVER (
+    PARTITION BY sku
+    ORDER BY (status <> 'deleted') DESC, updated_at DESC NULLS LAST, id DESC
+  ) as rn
+  FROM products
+  WHERE sku IS NOT NULL
+) d
+WHERE d.id = p.id AND d.rn > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_products_sku ON products(sku);
+
+COMMENT ON INDEX uq_products_sku IS 'Артикул уникален: ключ для ON CONFLICT (sku) при массовой загрузке';
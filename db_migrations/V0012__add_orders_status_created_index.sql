@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at DESC, id DESC);
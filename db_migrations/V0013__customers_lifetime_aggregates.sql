@@ -0,0 +1,48 @@
+UPDATE customers SET total_spent = 0 WHERE total_spent IS NULL;
+UPDATE customers SET total_orders = 0 WHERE total_orders IS NULL;
+ALTER TABLE customers ALTER COLUMN total_spent SET NOT NULL;
+ALTER TABLE customers ALTER COLUMN total_orders SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_customers_total_spent ON customers(total_spent DESC, id DESC);
+
+-- Отмененные и возвращенные заказы не входят в сумму покупок клиента
+CREATE OR REPLACE FUNCTION orders_counts_for_customer(p_status VARCHAR) RETURNS boolean AS $$
+  SELECT COALESCE(p_status, '') NOT IN ('cancelled', 'returned');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION orders_track_customer_totals() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.customer_id IS NOT NULL AND orders_counts_for_customer(OLD.status) THEN
+    UPDATE customers
+    SET total_spent = total_spent - COALESCE(OLD.total_amount, 0),
+        total_orders = total_orders - 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = OLD.customer_id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.customer_id IS NOT NULL AND orders_counts_for_customer(NEW.status) THEN
+    UPDATE customers
+    SET total_spent = total_spent + COALESCE(NEW.total_amount, 0),
+        total_orders = total_orders + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = NEW.customer_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_orders_track_customer_totals ON orders;
+CREATE TRIGGER trg_orders_track_customer_totals
+  AFTER INSERT OR DELETE OR UPDATE OF status, total_amount, customer_id ON orders
+  FOR EACH ROW EXECUTE FUNCTION orders_track_customer_totals();
+
+UPDATE customers c
+SET total_spent = COALESCE(t.total_spent, 0),
+    total_orders = COALESCE(t.total_orders, 0)
+FROM customers c2
+LEFT JOIN (
+  SELECT customer_id, SUM(total_amount) as total_spent, COUNT(*) as total_orders
+  FROM orders
+  WHERE orders_counts_for_customer(status)
+  GROUP BY customer_id
+) t ON t.customer_id = c2.id
+WHERE c.id = c2.id;
@@ -0,0 +1,18 @@
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS rfm_recency SMALLINT;
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS rfm_frequency SMALLINT;
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS rfm_monetary SMALLINT;
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS segment VARCHAR(50);
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS segmented_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_customers_updated ON customers(updated_at);
+CREATE INDEX IF NOT EXISTS idx_customers_segment ON customers(segment);
+
+CREATE TABLE IF NOT EXISTS ml_job_state (
+  job VARCHAR(50) PRIMARY KEY,
+  last_run_at TIMESTAMP,
+  last_full_run_at TIMESTAMP,
+  state JSONB NOT NULL DEFAULT '{}'::jsonb
+);
+
+COMMENT ON COLUMN customers.segment IS 'RFM-сегмент клиента (champions, loyal, at_risk, ...), считается ml-predictions';
+COMMENT ON TABLE ml_job_state IS 'Состояние инкрементальных ML-задач: время прошлого запуска и параметры (границы квантилей)';
@@ -0,0 +1,19 @@
+-- Только CREATE INDEX CONCURRENTLY: миграция выполняется вне транзакции.
+-- Если построение прервалось, индекс остается INVALID и IF NOT EXISTS его пропустит -
+-- V0015_2 это обнаружит; такой индекс удаляется DROP INDEX CONCURRENTLY и миграция повторяется.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_marketplace_products_product_marketplace
+  ON marketplace_products(product_id, marketplace_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_marketplace_products_marketplace
+  ON marketplace_products(marketplace_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_marketplace_created
+  ON orders(marketplace_id, created_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ml_predictions_type_created
+  ON ml_predictions(prediction_type, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ml_predictions_created
+  ON ml_predictions(created_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_marketplace_integrations_user_marketplace
+  ON user_marketplace_integrations(user_id, marketplace_id);
@@ -0,0 +1,19 @@
+-- Прерванный CREATE INDEX CONCURRENTLY оставляет INVALID индекс, который не используется
+-- планировщиком и не держит уникальность; останавливаем миграции, пока его не пересоздадут
+DO $$
+DECLARE
+  v_invalid TEXT;
+BEGIN
+  SELECT string_agg(c.relname, ', ') INTO v_invalid
+  FROM pg_index i
+  JOIN pg_class c ON c.oid = i.indexrelid
+  WHERE NOT i.indisvalid
+    AND c.relnamespace = current_schema()::regnamespace
+    AND c.relname IN ('uq_marketplace_products_product_marketplace', 'idx_marketplace_products_marketplace',
+                      'idx_orders_marketplace_created', 'idx_ml_predictions_type_created',
+                      'idx_ml_predictions_created', 'idx_user_marketplace_integrations_user_marketplace');
+  IF v_invalid IS NOT NULL THEN
+    RAISE EXCEPTION 'Invalid indexes after V0015_1: %. Drop them with DROP INDEX CONCURRENTLY and rerun V0015_1', v_invalid;
+  END IF;
+END;
+$$;
@@ -0,0 +1,7 @@
+-- Дубли связки товар/маркетплейс оставлялись синхронизацией без уникального ключа,
+-- сохраняем последнюю запись каждой пары. Уникальный индекс строится в V0015_1.
+DELETE FROM marketplace_products mp
+USING marketplace_products dup
+WHERE mp.product_id = dup.product_id
+  AND mp.marketplace_id = dup.marketplace_id
+  AND mp.ctid < dup.ctid;
@@ -0,0 +1,206 @@
+-- Помесячное секционирование orders и order_items по дате заказа.
+-- Окна аналитики (30 дней, предыдущий период) отсекаются до пары секций,
+-- старые месяцы отключаются от таблиц целиком вместо DELETE и VACUUM.
+
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER TABLE order_items RENAME TO order_items_unpartitioned;
+ALTER SEQUENCE orders_id_seq OWNED BY NONE;
+ALTER SEQUENCE order_items_id_seq OWNED BY NONE;
+
+UPDATE orders_unpartitioned
+SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP)
+WHERE created_at IS NULL;
+
+CREATE TABLE orders (LIKE orders_unpartitioned INCLUDING DEFAULTS INCLUDING COMMENTS)
+  PARTITION BY RANGE (created_at);
+ALTER TABLE orders ALTER COLUMN created_at SET NOT NULL;
+
+-- Строка заказа лежит в том же месяце, что и заказ: ключ секционирования и внешний ключ совпадают
+CREATE TABLE order_items (
+  LIKE order_items_unpartitioned INCLUDING DEFAULTS INCLUDING COMMENTS,
+  order_created_at TIMESTAMP NOT NULL
+) PARTITION BY RANGE (order_created_at);
+
+COMMENT ON COLUMN order_items.order_created_at IS 'Дата заказа (orders.created_at) - ключ секционирования и часть ссылки на orders';
+
+CREATE TABLE IF NOT EXISTS orders_partition_archive (
+  partition_name VARCHAR(63) PRIMARY KEY,
+  parent_table VARCHAR(63) NOT NULL,
+  range_start DATE NOT NULL,
+  range_end DATE NOT NULL,
+  detached_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Создает секции orders/order_items за месяц p_month. Строки этого месяца,
+-- успевшие попасть в секцию по умолчанию, переносятся через родительские таблицы,
+-- чтобы триггеры сначала сняли, а затем снова учли их (итоги клиентов, реестр номеров).
+CREATE OR REPLACE FUNCTION orders_create_month_partition(p_month DATE) RETURNS boolean AS $$
+DECLARE
+  v_start DATE := date_trunc('month', p_month)::date;
+  v_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::date;
+  v_suffix TEXT := to_char(date_trunc('month', p_month), 'YYYYMM');
+BEGIN
+  IF to_regclass('orders_p' || v_suffix) IS NOT NULL THEN
+    RETURN false;
+  END IF;
+
+  DROP TABLE IF EXISTS orders_partition_moved_items;
+  DROP TABLE IF EXISTS orders_partition_moved;
+  CREATE TEMP TABLE orders_partition_moved_items (LIKE order_items_default) ON COMMIT DROP;
+  CREATE TEMP TABLE orders_partition_moved (LIKE orders_default) ON COMMIT DROP;
+  WITH moved AS (
+    DELETE FROM order_items_default
+    WHERE order_created_at >= v_start AND order_created_at < v_end
+    RETURNING *
+  )
+  INSERT INTO orders_partition_moved_items SELECT * FROM moved;
+  WITH moved AS (
+    DELETE FROM orders_default
+    WHERE created_at >= v_start AND created_at < v_end
+    RETURNING *
+  )
+  INSERT INTO orders_partition_moved SELECT * FROM moved;
+
+  EXECUTE format('CREATE TABLE %I PARTITION OF orders FOR VALUES FROM (%L) TO (%L)',
+                 'orders_p' || v_suffix, v_start, v_end);
+  EXECUTE format('CREATE TABLE %I PARTITION OF order_items FOR VALUES FROM (%L) TO (%L)',
+                 'order_items_p' || v_suffix, v_start, v_end);
+
+  INSERT INTO orders SELECT * FROM orders_partition_moved;
+  INSERT INTO order_items SELECT * FROM orders_partition_moved_items;
+  RETURN true;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+-- Держит секции на p_months_ahead месяцев вперед; вызывается по расписанию (api orders/partitions)
+CREATE OR REPLACE FUNCTION orders_ensure_partitions(p_months_ahead INTEGER DEFAULT 3,
+                                                    p_from DATE DEFAULT NULL) RETURNS INTEGER AS $$
+DECLARE
+  v_month DATE := date_trunc('month', COALESCE(p_from, CURRENT_DATE))::date;
+  v_last DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead))::date;
+  v_created INTEGER := 0;
+BEGIN
+  WHILE v_month <= v_last LOOP
+    IF orders_create_month_partition(v_month) THEN
+      v_created := v_created + 1;
+    END IF;
+    v_month := (v_month + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN v_created;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+-- Отключает секции старше p_keep_months месяцев. Отключенные таблицы остаются
+-- в схеме как архив (orders_partition_archive) и могут быть выгружены или удалены отдельно.
+CREATE OR REPLACE FUNCTION orders_detach_partitions(p_keep_months INTEGER DEFAULT 36) RETURNS INTEGER AS $$
+DECLARE
+  v_cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::date;
+  v_part RECORD;
+  v_items TEXT;
+  v_fk TEXT;
+  v_detached INTEGER := 0;
+BEGIN
+  FOR v_part IN
+    SELECT c.relname, to_date(substring(c.relname FROM '(\d{6})$'), 'YYYYMM') as range_start
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'orders'::regclass
+      AND c.relname ~ '^orders_p\d{6}$'
+    ORDER BY c.relname
+  LOOP
+    EXIT WHEN v_part.range_start >= v_cutoff;
+    v_items := 'order_items_p' || to_char(v_part.range_start, 'YYYYMM');
+
+    -- Сначала строки заказов: после отключения их ссылка на orders уже не нужна
+    IF to_regclass(v_items) IS NOT NULL THEN
+      EXECUTE format('ALTER TABLE order_items DETACH PARTITION %I', v_items);
+      FOR v_fk IN
+        SELECT conname FROM pg_constraint WHERE conrelid = v_items::regclass AND contype = 'f'
+      LOOP
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', v_items, v_fk);
+      END LOOP;
+      INSERT INTO orders_partition_archive (partition_name, parent_table, range_start, range_end)
+      VALUES (v_items, 'order_items', v_part.range_start, (v_part.range_start + INTERVAL '1 month')::date)
+      ON CONFLICT (partition_name) DO NOTHING;
+    END IF;
+
+    EXECUTE format('ALTER TABLE orders DETACH PARTITION %I', v_part.relname);
+    INSERT INTO orders_partition_archive (partition_name, parent_table, range_start, range_end)
+    VALUES (v_part.relname, 'orders', v_part.range_start, (v_part.range_start + INTERVAL '1 month')::date)
+    ON CONFLICT (partition_name) DO NOTHING;
+    v_detached := v_detached + 1;
+  END LOOP;
+  RETURN v_detached;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+CREATE TABLE order_items_default PARTITION OF order_items DEFAULT;
+
+SELECT orders_ensure_partitions(3, (SELECT MIN(created_at)::date FROM orders_unpartitioned));
+
+INSERT INTO orders SELECT * FROM orders_unpartitioned;
+INSERT INTO order_items
+SELECT oi.*, COALESCE(o.created_at, oi.created_at, CURRENT_TIMESTAMP)
+FROM order_items_unpartitioned oi
+LEFT JOIN orders_unpartitioned o ON o.id = oi.order_id;
+
+DROP TABLE order_items_unpartitioned;
+DROP TABLE orders_unpartitioned;
+
+ALTER SEQUENCE orders_id_seq OWNED BY orders.id;
+ALTER SEQUENCE order_items_id_seq OWNED BY order_items.id;
+
+ALTER TABLE orders ADD CONSTRAINT orders_pkey PRIMARY KEY (id, created_at);
+ALTER TABLE orders ADD CONSTRAINT orders_customer_id_fkey FOREIGN KEY (customer_id) REFERENCES customers(id);
+ALTER TABLE orders ADD CONSTRAINT orders_marketplace_id_fkey FOREIGN KEY (marketplace_id) REFERENCES marketplaces(id);
+
+ALTER TABLE order_items ADD CONSTRAINT order_items_pkey PRIMARY KEY (id, order_created_at);
+ALTER TABLE order_items ADD CONSTRAINT order_items_order_fkey
+  FOREIGN KEY (order_id, order_created_at) REFERENCES orders(id, created_at);
+ALTER TABLE order_items ADD CONSTRAINT order_items_product_id_fkey FOREIGN KEY (product_id) REFERENCES products(id);
+
+CREATE INDEX IF NOT EXISTS idx_orders_number ON orders(order_number);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_marketplace_created ON orders(marketplace_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id);
+
+-- Уникальный индекс секционированной таблицы обязан включать created_at,
+-- поэтому глобальная уникальность номера заказа держится на отдельном реестре
+CREATE TABLE IF NOT EXISTS order_numbers (
+  order_number VARCHAR(50) PRIMARY KEY,
+  order_id INTEGER NOT NULL,
+  created_at TIMESTAMP NOT NULL
+);
+
+INSERT INTO order_numbers (order_number, order_id, created_at)
+SELECT order_number, id, created_at FROM orders
+ON CONFLICT (order_number) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION orders_track_order_number() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    DELETE FROM order_numbers WHERE order_number = OLD.order_number AND order_id = OLD.id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO order_numbers (order_number, order_id, created_at)
+    VALUES (NEW.order_number, NEW.id, NEW.created_at);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE TRIGGER trg_orders_track_order_number
+  AFTER INSERT OR DELETE OR UPDATE OF order_number, created_at ON orders
+  FOR EACH ROW EXECUTE FUNCTION orders_track_order_number();
+
+CREATE TRIGGER trg_orders_track_customer_totals
+  AFTER INSERT OR DELETE OR UPDATE OF status, total_amount, customer_id ON orders
+  FOR EACH ROW EXECUTE FUNCTION orders_track_customer_totals();
+
+ANALYZE orders;
+ANALYZE order_items;
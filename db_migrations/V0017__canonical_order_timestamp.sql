@@ -0,0 +1,26 @@
+-- Каноническое время заказа - orders.created_at: его пишут webhook Ozon и синхронизация,
+-- оно NOT NULL, индексировано и служит ключом секционирования.
+-- Колонка order_date, если была добавлена вручную, переносится в created_at и удаляется.
+
+ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_order_fkey;
+ALTER TABLE order_items ADD CONSTRAINT order_items_order_fkey
+  FOREIGN KEY (order_id, order_created_at) REFERENCES orders(id, created_at) ON UPDATE CASCADE;
+
+DO $$
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'orders' AND column_name = 'order_date'
+  ) THEN
+    UPDATE orders
+    SET created_at = order_date
+    WHERE order_date IS NOT NULL AND created_at IS DISTINCT FROM order_date;
+    ALTER TABLE orders DROP COLUMN order_date;
+  END IF;
+END $$;
+
+COMMENT ON COLUMN orders.created_at IS 'Время оформления заказа на маркетплейсе; единственная дата заказа для аналитики и прогнозов';
+
+-- Продажи товара за окно читаются из order_items без обращения к orders
+CREATE INDEX IF NOT EXISTS idx_order_items_product_created ON order_items(product_id, order_created_at);
+DROP INDEX IF EXISTS idx_order_items_product;
@@ -0,0 +1,91 @@
+-- Лента изменений для дешевого опроса клиентами: каждая запись в отслеживаемые таблицы
+-- получает номер версии из общей последовательности и номер транзакции-писателя.
+-- Номера последовательности фиксируются не по порядку (длинная транзакция коммитит
+-- меньшие номера позже), поэтому клиент читает ленту по номеру транзакции: отдаются
+-- только строки транзакций младше xmin текущего снимка - все они уже завершены,
+-- и новых строк с такими номерами появиться не может.
+CREATE TABLE IF NOT EXISTS change_log (
+  version BIGSERIAL PRIMARY KEY,
+  txid BIGINT NOT NULL DEFAULT txid_current(),
+  table_name VARCHAR(63) NOT NULL,
+  marketplace_id INTEGER,
+  row_key VARCHAR(100) NOT NULL,
+  op CHAR(1) NOT NULL,
+  changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN change_log.row_key IS 'Ключ строки в том виде, в каком его видит клиент: id, для orders - order_number';
+COMMENT ON COLUMN change_log.op IS 'I - вставка, U - изменение, D - удаление';
+COMMENT ON COLUMN change_log.txid IS 'Транзакция, записавшая строку; курсор клиента - пара (txid, version)';
+
+CREATE INDEX IF NOT EXISTS idx_change_log_table_txid ON change_log(table_name, txid, version);
+CREATE INDEX IF NOT EXISTS idx_change_log_marketplace_txid ON change_log(marketplace_id, table_name, txid, version)
+  WHERE marketplace_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at);
+
+-- Старшая транзакция среди удаленных очисткой строк: клиент с курсором не новее
+-- мог их не получить и должен перезагрузить списки целиком
+CREATE TABLE IF NOT EXISTS change_log_horizon (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  pruned_txid BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO change_log_horizon (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- TG_ARGV[0] - имя таблицы для ленты (у секций orders свой TG_TABLE_NAME), TG_ARGV[1] - колонка ключа
+CREATE OR REPLACE FUNCTION change_log_record() RETURNS trigger AS $$
+DECLARE
+  v_row JSONB;
+BEGIN
+  v_row := to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END);
+  INSERT INTO change_log (table_name, marketplace_id, row_key, op)
+  VALUES (TG_ARGV[0], (v_row->>'marketplace_id')::integer, v_row->>TG_ARGV[1], left(TG_OP, 1));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+-- Изменение, после которого строка отличается только отметками времени (пересчет итогов
+-- или RFM-сегментов с теми же числами, повторная синхронизация), в ленту не попадает,
+-- иначе каждый пересчет отдавал бы клиентам всю таблицу
+CREATE OR REPLACE FUNCTION change_log_row_changed(p_old ANYELEMENT, p_new ANYELEMENT) RETURNS boolean AS $$
+  SELECT to_jsonb(p_old) - 'updated_at' - 'segmented_at' IS DISTINCT FROM to_jsonb(p_new) - 'updated_at' - 'segmented_at';
+$$ LANGUAGE sql STABLE;
+
+DROP TRIGGER IF EXISTS trg_orders_change_log ON orders;
+CREATE TRIGGER trg_orders_change_log
+  AFTER INSERT OR DELETE ON orders
+  FOR EACH ROW EXECUTE FUNCTION change_log_record('orders', 'order_number');
+DROP TRIGGER IF EXISTS trg_orders_change_log_update ON orders;
+CREATE TRIGGER trg_orders_change_log_update
+  AFTER UPDATE ON orders
+  FOR EACH ROW WHEN (change_log_row_changed(OLD, NEW))
+  EXECUTE FUNCTION change_log_record('orders', 'order_number');
+
+DROP TRIGGER IF EXISTS trg_products_change_log ON products;
+CREATE TRIGGER trg_products_change_log
+  AFTER INSERT OR DELETE ON products
+  FOR EACH ROW EXECUTE FUNCTION change_log_record('products', 'id');
+DROP TRIGGER IF EXISTS trg_products_change_log_update ON products;
+CREATE TRIGGER trg_products_change_log_update
+  AFTER UPDATE ON products
+  FOR EACH ROW WHEN (change_log_row_changed(OLD, NEW))
+  EXECUTE FUNCTION change_log_record('products', 'id');
+
+DROP TRIGGER IF EXISTS trg_customers_change_log ON customers;
+CREATE TRIGGER trg_customers_change_log
+  AFTER INSERT OR DELETE ON customers
+  FOR EACH ROW EXECUTE FUNCTION change_log_record('customers', 'id');
+DROP TRIGGER IF EXISTS trg_customers_change_log_update ON customers;
+CREATE TRIGGER trg_customers_change_log_update
+  AFTER UPDATE ON customers
+  FOR EACH ROW WHEN (change_log_row_changed(OLD, NEW))
+  EXECUTE FUNCTION change_log_record('customers', 'id');
+
+DROP TRIGGER IF EXISTS trg_marketplace_products_change_log ON marketplace_products;
+CREATE TRIGGER trg_marketplace_products_change_log
+  AFTER INSERT OR DELETE ON marketplace_products
+  FOR EACH ROW EXECUTE FUNCTION change_log_record('marketplace_products', 'product_id');
+DROP TRIGGER IF EXISTS trg_marketplace_products_change_log_update ON marketplace_products;
+CREATE TRIGGER trg_marketplace_products_change_log_update
+  AFTER UPDATE ON marketplace_products
+  FOR EACH ROW WHEN (change_log_row_changed(OLD, NEW))
+  EXECUTE FUNCTION change_log_record('marketplace_products', 'product_id');
@@ -0,0 +1,16 @@
+-- Оповещение orders_events для долгого опроса api orders/stream шлет сама таблица,
+-- поэтому его получают изменения из любого пути записи: вебхук Ozon, синхронизация
+-- и смена статуса в crm-api, массовые операции. Триггер уровня оператора, а одинаковые
+-- оповещения внутри транзакции PostgreSQL склеивает - пакет из тысячи заказов будит
+-- слушателей один раз. Получатель перечитывает change_log, поэтому полезная нагрузка минимальна.
+CREATE OR REPLACE FUNCTION orders_notify_change() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('orders_events', json_build_object('table', 'orders', 'op', TG_OP)::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+DROP TRIGGER IF EXISTS trg_orders_notify_change ON orders;
+CREATE TRIGGER trg_orders_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON orders
+  FOR EACH STATEMENT EXECUTE FUNCTION orders_notify_change();
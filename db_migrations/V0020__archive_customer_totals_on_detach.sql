@@ -0,0 +1,84 @@
+-- Отключение секции не запускает триггеры orders, поэтому итоги клиентов остаются
+-- пожизненными, но сверка api customers/recompute видит только подключенные секции.
+-- Вклад отключенных месяцев сохраняется отдельно и прибавляется при сверке;
+-- номера архивных заказов уходят из реестра order_numbers вместе с секцией.
+CREATE TABLE IF NOT EXISTS customer_archived_totals (
+  customer_id INTEGER PRIMARY KEY REFERENCES customers(id),
+  total_spent DECIMAL(12, 2) NOT NULL DEFAULT 0,
+  total_orders INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION orders_archive_partition_totals(p_partition TEXT) RETURNS void AS $$
+BEGIN
+  EXECUTE format($sql$
+    INSERT INTO customer_archived_totals (customer_id, total_spent, total_orders)
+    SELECT customer_id, COALESCE(SUM(total_amount), 0), COUNT(*)
+    FROM %I
+    WHERE customer_id IS NOT NULL AND orders_counts_for_customer(status)
+    GROUP BY customer_id
+    ON CONFLICT (customer_id) DO UPDATE SET
+      total_spent = customer_archived_totals.total_spent + EXCLUDED.total_spent,
+      total_orders = customer_archived_totals.total_orders + EXCLUDED.total_orders
+  $sql$, p_partition);
+  EXECUTE format('DELETE FROM order_numbers n USING %I o WHERE n.order_number = o.order_number AND n.order_id = o.id',
+                 p_partition);
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+CREATE OR REPLACE FUNCTION orders_detach_partitions(p_keep_months INTEGER DEFAULT 36) RETURNS INTEGER AS $$
+DECLARE
+  v_cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::date;
+  v_part RECORD;
+  v_items TEXT;
+  v_fk TEXT;
+  v_detached INTEGER := 0;
+BEGIN
+  FOR v_part IN
+    SELECT c.relname, to_date(substring(c.relname FROM '(\d{6})$'), 'YYYYMM') as range_start
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'orders'::regclass
+      AND c.relname ~ '^orders_p\d{6}$'
+    ORDER BY c.relname
+  LOOP
+    EXIT WHEN v_part.range_start >= v_cutoff;
+    v_items := 'order_items_p' || to_char(v_part.range_start, 'YYYYMM');
+
+    -- Сначала строки заказов: после отключения их ссылка на orders уже не нужна
+    IF to_regclass(v_items) IS NOT NULL THEN
+      EXECUTE format('ALTER TABLE order_items DETACH PARTITION %I', v_items);
+      FOR v_fk IN
+        SELECT conname FROM pg_constraint WHERE conrelid = v_items::regclass AND contype = 'f'
+      LOOP
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', v_items, v_fk);
+      END LOOP;
+      INSERT INTO orders_partition_archive (partition_name, parent_table, range_start, range_end)
+      VALUES (v_items, 'order_items', v_part.range_start, (v_part.range_start + INTERVAL '1 month')::date)
+      ON CONFLICT (partition_name) DO NOTHING;
+    END IF;
+
+    PERFORM orders_archive_partition_totals(v_part.relname);
+    EXECUTE format('ALTER TABLE orders DETACH PARTITION %I', v_part.relname);
+    INSERT INTO orders_partition_archive (partition_name, parent_table, range_start, range_end)
+    VALUES (v_part.relname, 'orders', v_part.range_start, (v_part.range_start + INTERVAL '1 month')::date)
+    ON CONFLICT (partition_name) DO NOTHING;
+    v_detached := v_detached + 1;
+  END LOOP;
+  RETURN v_detached;
+END;
+$$ LANGUAGE plpgsql SET search_path FROM CURRENT;
+
+-- Секции, отключенные до этой миграции
+DO $$
+DECLARE
+  v_part TEXT;
+BEGIN
+  FOR v_part IN
+    SELECT partition_name FROM orders_partition_archive
+    WHERE parent_table = 'orders' AND to_regclass(partition_name) IS NOT NULL
+    ORDER BY partition_name
+  LOOP
+    PERFORM orders_archive_partition_totals(v_part);
+  END LOOP;
+END;
+$$;
@@ -0,0 +1,54 @@
+'''
+Business: Замер пропускной способности входа (логинов в секунду) для разных стоимостей bcrypt
+Args: --logins - число проверок пароля на каждую стоимость, --rounds - список стоимостей,
+      --workers - число одновременных входов
+Returns: таблица в stdout: стоимость, мс на хеш, логинов/сек при --workers параллельных входах
+'''
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Скрипт лежит вне каталогов функций, чтобы не попадать в деплой; хеширование берется из функции auth
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'auth'))
+# Модуль auth проверяет секрет токенов при импорте; для замера хеширования токены не выпускаются
+os.environ.setdefault('AUTH_TOKEN_SECRET', 'benchmark-only')
+
+from index import MIN_HASH_ROUNDS, MAX_HASH_ROUNDS, _bcrypt_check, _bcrypt_hash  # noqa: E402
+
+
+def bench_rounds(rounds: int, logins: int, workers: int) -> tuple:
+    password = 'benchmark-password'
+    password_hash = _bcrypt_hash(password, rounds)
+
+    started = time.perf_counter()
+    _bcrypt_check(password, password_hash)
+    single_ms = (time.perf_counter() - started) * 1000
+
+    # Пул здесь имитирует одновременные вызовы функции в теплом контейнере
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        started = time.perf_counter()
+        wait([pool.submit(_bcrypt_check, password, password_hash) for _ in range(logins)])
+        elapsed = time.perf_counter() - started
+
+    return single_ms, logins / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, nargs='*',
+                        default=list(range(MIN_HASH_ROUNDS, MAX_HASH_ROUNDS + 1)))
+    args = parser.parse_args()
+
+    print(f'{"rounds":>6} {"ms/hash":>10} {"logins/s":>10}')
+    for rounds in args.rounds:
+        single_ms, per_second = bench_rounds(rounds, args.logins, args.workers)
+        print(f'{rounds:>6} {single_ms:>10.1f} {per_second:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+'''
+Business: Проверка планов горячих запросов - каждый должен идти по своему индексу, а не seq scan
+Args: DATABASE_URL в окружении; --verbose - печатать планы целиком
+Returns: строка на запрос в stdout, код выхода 1 если хотя бы один запрос не использует ожидаемый индекс
+'''
+
+import argparse
+import json
+import os
+import sys
+
+import psycopg2
+
+SCHEMA = 't_p86529894_ecommerce_management'
+
+# Запрос, параметры и индекс, который должен оказаться в плане
+HOT_QUERIES = [
+    (
+        'product by sku',
+        f"SELECT id FROM {SCHEMA}.products WHERE sku = %s LIMIT 1",
+        ('SKU-1',),
+        'uq_products_sku',
+    ),
+    (
+        'product typo search',
+        f"SELECT id FROM {SCHEMA}.products p WHERE p.name %% %s ORDER BY similarity(p.name, %s) DESC LIMIT 20",
+        ('наушнеки', 'наушнеки'),
+        'idx_products_name_trgm',
+    ),
+    (
+        'marketplace link upsert key',
+        f"SELECT 1 FROM {SCHEMA}.marketplace_products WHERE product_id = %s AND marketplace_id = %s",
+        (1, 1),
+        'uq_marketplace_products_product_marketplace',
+    ),
+    (
+        'marketplace orders',
+        f"SELECT * FROM {SCHEMA}.orders WHERE marketplace_id = %s ORDER BY created_at DESC LIMIT 50",
+        (1,),
+        'idx_orders_marketplace_created',
+    ),
+    (
+        'orders page by status',
+        f"SELECT id FROM {SCHEMA}.orders WHERE status = %s ORDER BY created_at DESC, id DESC LIMIT 50",
+        ('pending',),
+        'idx_orders_status_created',
+    ),
+    (
+        'recent orders',
+        f"SELECT id FROM {SCHEMA}.orders ORDER BY created_at DESC, id DESC LIMIT 50",
+        (),
+        'idx_orders_created',
+    ),
+    (
+        'product sales window',
+        f"SELECT SUM(quantity) FROM {SCHEMA}.order_items WHERE product_id = %s "
+        f"AND order_created_at >= now() - interval '30 days' AND order_created_at < now()",
+        (1,),
+        'idx_order_items_product_created',
+    ),
+    (
+        'predictions by type',
+        f"SELECT * FROM {SCHEMA}.ml_predictions WHERE prediction_type = %s ORDER BY created_at DESC LIMIT 50",
+        ('sales_forecast',),
+        'idx_ml_predictions_type_created',
+    ),
+    (
+        'customer by email',
+        f"SELECT id FROM {SCHEMA}.customers WHERE email = %s",
+        ('demo@example.com',),
+        'customers_email_key',
+    ),
+]
+
+
+def plan_indexes(node: dict) -> set:
+    found = set()
+    if 'Index Name' in node:
+        found.add(node['Index Name'])
+    for child in node.get('Plans', []):
+        found |= plan_indexes(child)
+    return found
+
+
+def index_family(cur, index_name: str) -> set:
+    # У секционированной таблицы в плане видны индексы секций, унаследованные от индекса родителя
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (f'{SCHEMA}.{index_name}',))
+    return {index_name} | {row[0] for row in cur.fetchall()}
+
+
+def check_plans(conn, verbose: bool = False) -> list:
+    failures = []
+    cur = conn.cursor()
+    # На маленьких таблицах планировщик честно выбирает seq scan,
+    # поэтому запрещаем его: проверяем, что индекс пригоден, а не что он выгоднее
+    cur.execute("SET enable_seqscan = off")
+    for name, query, params, index_name in HOT_QUERIES:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        used = plan_indexes(plan[0]['Plan'])
+        ok = bool(used & index_family(cur, index_name))
+        print(f'{"ok" if ok else "FAIL":>4}  {name}: {index_name}' + ('' if ok else f' (used: {sorted(used) or "none"})'))
+        if verbose:
+            print(json.dumps(plan, indent=2))
+        if not ok:
+            failures.append(name)
+    cur.close()
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        failures = check_plans(conn, args.verbose)
+    finally:
+        conn.rollback()
+        conn.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+'''
+Business: Сравнение старой (RealDictCursor + dict(row) + json.dumps(default=str)) и новой сериализации ответов
+Args: --rows - число строк на ответ, --repeat - число повторов; DATABASE_URL в окружении - замер на живых запросах
+Returns: таблица в stdout: эндпоинт, мс на ответ старым и новым способом, ускорение
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Скрипт лежит вне каталогов функций, чтобы не попадать в деплой; модуль берется из копии crm-api
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'crm-api'))
+
+from serialization import dumps, fetch_records, orjson  # noqa: E402
+
+SCHEMA = 't_p86529894_ecommerce_management'
+
+# Запросы списков, которые отдают крупные ответы
+ENDPOINT_QUERIES = {
+    'getOrders': f'''
+        SELECT o.*, c.name as customer_name, c.email as customer_email,
+               m.name as marketplace_name, m.slug as marketplace_slug
+        FROM {SCHEMA}.orders o
+        JOIN {SCHEMA}.customers c ON o.customer_id = c.id
+        LEFT JOIN {SCHEMA}.marketplaces m ON o.marketplace_id = m.id
+        ORDER BY o.created_at DESC
+        LIMIT %s
+    ''',
+    'getProducts': f"SELECT * FROM {SCHEMA}.products p WHERE p.status <> 'deleted' ORDER BY p.created_at DESC LIMIT %s",
+    'getPredictions': f'SELECT * FROM {SCHEMA}.ml_predictions ORDER BY created_at DESC LIMIT %s',
+}
+
+
+class FakeCursor:
+    '''Курсор с заранее подготовленными строками-кортежами'''
+
+    def __init__(self, names, rows):
+        self.description = [(name,) for name in names]
+        self._rows = rows
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+def synthetic_rows(endpoint: str, count: int):
+    now = datetime(2024, 6, 1, 12, 0, 0)
+    if endpoint == 'getOrders':
+        names = ['id', 'order_number', 'customer_id', 'status', 'total_amount', 'items_count',
+                 'created_at', 'updated_at', 'marketplace_id', 'customer_name', 'customer_email', 'marketplace_name']
+        rows = [(i, f'0{i:09d}-0001-1', i % 500, 'delivered', Decimal('1299.90'), 3,
+                 now - timedelta(minutes=i), now, 4, f'Клиент Ozon #{i}', f'ozon_customer_{i}@marketplace.com', 'Ozon')
+                for i in range(count)]
+    elif endpoint == 'getProducts':
+        names = ['id', 'sku', 'name', 'description', 'price', 'cost_price', 'category', 'stock', 'status',
+                 'image_url', 'created_at', 'updated_at']
+        rows = [(i, f'SKU-{i}', f'Товар {i}', 'Описание товара', Decimal('499.00'), Decimal('250.00'),
+                 'Электроника', i % 40, 'active', 'https://example.com/image.jpg', now, now)
+                for i in range(count)]
+    else:
+        names = ['id', 'prediction_type', 'product_id', 'prediction_value', 'confidence_score',
+                 'prediction_date', 'created_at']
+        rows = [(i, 'sales_forecast', i, '[{"date": "2024-06-02", "predictedSales": 3}]', Decimal('0.87'),
+                 now.date(), now) for i in range(count)]
+    return names, rows
+
+
+def old_path(names, rows) -> str:
+    # RealDictCursor собирает dict на каждую строку, затем обработчик копирует его через dict(row)
+    records = [dict(dict(zip(names, row))) for row in rows]
+    return json.dumps({'items': records}, default=str)
+
+
+def new_path(names, rows) -> str:
+    return dumps({'items': fetch_records(FakeCursor(names, rows))})
+
+
+def bench(fn, names, rows, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(names, rows)
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def live_rows(conn, endpoint: str, count: int):
+    cur = conn.cursor()
+    cur.execute(ENDPOINT_QUERIES[endpoint], (count,))
+    names = [column[0] for column in cur.description]
+    rows = cur.fetchall()
+    cur.close()
+    return names, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    conn = None
+    if os.environ.get('DATABASE_URL'):
+        import psycopg2
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+
+    print(f'encoder: {"orjson" if orjson else "json"}, rows: {args.rows}, source: {"database" if conn else "synthetic"}')
+    print(f'{"endpoint":>16} {"rows":>7} {"old ms":>9} {"new ms":>9} {"speedup":>8}')
+    for endpoint in ENDPOINT_QUERIES:
+        names, rows = live_rows(conn, endpoint, args.rows) if conn else synthetic_rows(endpoint, args.rows)
+        assert json.loads(old_path(names, rows)) == json.loads(new_path(names, rows))
+        old_ms = bench(old_path, names, rows, args.repeat)
+        new_ms = bench(new_path, names, rows, args.repeat)
+        print(f'{endpoint:>16} {len(rows):>7} {old_ms:>9.2f} {new_ms:>9.2f} {old_ms / new_ms:>7.1f}x')
+
+    if conn:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()